@@ -1,5 +1,6 @@
 from core.executor import Executor
 from core.profile import Profile
+from core.catalog import ExpeditionCatalog
 from gpt_interface.prompt_handler import PromptHandler
 import xarray as xr
 import pandas as pd
@@ -8,17 +9,14 @@ from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple
 from datetime import datetime
 import numpy as np
-def find_profile_pairs(l0_dir: Path) -> List[Tuple[Path, Path]]:
-    """Find matching .txt and .log files"""
-    txt_files = list(l0_dir.glob("*.txt"))
-    profile_pairs = []
+def find_profile_pairs(l0_dir: Path, **filters) -> List[Tuple[Path, Path]]:
+    """Find matching .txt and .log files through the expedition catalog
     
-    for txt_file in txt_files:
-        log_file = txt_file.with_suffix('.log')
-        if log_file.exists():
-            profile_pairs.append((txt_file, log_file))
-    
-    return profile_pairs
+    filters are passed to ExpeditionCatalog.query, e.g. gas_type='N2O', min_depth=50
+    """
+    catalog = ExpeditionCatalog(l0_dir.parent / "catalog.sqlite")
+    catalog.build(l0_dir)
+    return catalog.profile_pairs(**filters)
 def clean_column_name(name: str) -> str:
     """Clean column name for NetCDF compatibility"""
     # Replace brackets, spaces and special chars
@@ -0,0 +1,68 @@
+"""Peak memory and time of the L1B flag filtering, copying vs in place.
+
+Run from the repository root:
+    python scripts/benchmark_filtering.py [data/lexplore/Level0]
+"""
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+# Add src to path
+src_dir = Path(__file__).resolve().parent.parent / 'src'
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from core.profile import Profile
+from preprocessing.cleaner import DataCleaner
+from process_profiles import VALIDATOR, VALIDATION_CONFIG
+
+
+def validated(data_path: Path, packed_flags: bool) -> DataCleaner:
+    """Cleaner holding a fully loaded and validated L0 frame"""
+    df, _ = Profile(data_path).load()
+    cleaner = DataCleaner(df, packed_flags=packed_flags)
+    cleaner.calculate_rsd(VALIDATION_CONFIG['gas_rules'].keys())
+    cleaner.validate_data(VALIDATOR)
+    return cleaner
+
+
+def filter_l1b(cleaner: DataCleaner, inplace: bool) -> None:
+    cleaner.filter_flagged_row(inplace=inplace)
+    cleaner.filter_flagged_rows(columns_to_check=['Error Standard'], inplace=inplace)
+
+
+def measure(cleaner: DataCleaner, inplace: bool):
+    """Peak memory allocated during the filtering (bytes) and wall time (s)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    filter_l1b(cleaner, inplace)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main(l0_dir: Path):
+    for packed_flags in [False, True]:
+        print(f"\n{'packed QC word' if packed_flags else '*_FLAG columns'}:")
+        totals = {False: [0, 0.0], True: [0, 0.0]}
+        for data_path in sorted(l0_dir.rglob("*.txt")):
+            line = f"{data_path.name:<45}"
+            for inplace in [False, True]:
+                cleaner = validated(data_path, packed_flags)
+                if inplace is False:
+                    frame_mb = cleaner.df.memory_usage(deep=True).sum() / 1024**2
+                    line += f" frame {frame_mb:6.1f} MB"
+                peak, elapsed = measure(cleaner, inplace)
+                totals[inplace][0] = max(totals[inplace][0], peak)
+                totals[inplace][1] += elapsed
+                line += (f"  {'in place' if inplace else 'copy'}: "
+                         f"{peak / 1024**2:6.1f} MB peak {elapsed * 1000:6.1f} ms")
+            print(line)
+        for inplace, (peak, elapsed) in totals.items():
+            print(f"  {'in place' if inplace else 'copy':<9} max peak {peak / 1024**2:6.1f} MB"
+                  f"  total {elapsed * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else Path("data/lexplore/Level0"))
@@ -0,0 +1,98 @@
+"""Compare the depth binning engine with the interpolating gridders.
+
+Each L0 file is split into casts (DerivedParameters.segment_casts), then
+every cast is gridded every 5 cm with DepthGridder_xr.interpolate_to_grid
+(groupby on raw depths + xarray interp), DepthGridder_xr.bin_to_grid
+(bin_by_depth) and PressureGridder_xr (both directions of a cast at once).
+`--repeat N` tiles every file N times along time to mimic long records.
+
+Run from the repository root:
+    python scripts/benchmark_gridding.py [data/lexplore/Level0] [--repeat N]
+"""
+from pathlib import Path
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+# Add src to path
+src_dir = Path(__file__).resolve().parent.parent / 'src'
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from core.profile import Profile
+from preprocessing.derived_parameters import DerivedParameters
+from preprocessing.depth_gridder import DepthGridder_xr
+from preprocessing.pressure_gridder import PressureGridder_xr
+from process_profiles import clean_string_for_netcdf
+
+DEPTH_INTERVAL = 0.05
+
+
+def best_of(func, repeat: int) -> float:
+    """Best wall time of `repeat` calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def casts(data_path: Path, copies: int) -> pd.DataFrame:
+    """L0 frame split into casts, with NetCDF column names like the L3A stage"""
+    df, _ = Profile(data_path).load()
+    if copies > 1:
+        df = pd.concat([df] * copies, ignore_index=True)
+        df['datetime'] = df['datetime'].iloc[0] + pd.to_timedelta(np.arange(len(df)), unit='s')
+    df = DerivedParameters(df).segment_casts(pressure_threshold=0.03)
+    df.columns = [clean_string_for_netcdf(col) for col in df.columns]
+    return df
+
+
+def grid_casts(df: pd.DataFrame, method: str) -> None:
+    for _, cast_df in df.groupby(['cast', 'is_downcast']):
+        gridder = DepthGridder_xr(cast_df.drop(columns='cast'))
+        getattr(gridder, method)(depth_interval=DEPTH_INTERVAL)
+
+
+def pressure_gridder(df: pd.DataFrame) -> None:
+    for _, cast_df in df.groupby('cast'):
+        depth = cast_df['Depth__meter_']
+        with warnings.catch_warnings():
+            # xarray's future concat join default
+            warnings.simplefilter('ignore', FutureWarning)
+            gridder = PressureGridder_xr(cast_df.drop(columns='cast'), pressure_min=np.floor(depth.min()),
+                                         pressure_max=np.ceil(depth.max()))
+        gridder.interpolate_to_grid(pressure_interval=DEPTH_INTERVAL)
+
+
+def main(l0_dir: Path, copies: int = 1, repeat: int = 3):
+    methods = {
+        'interpolate': lambda df: grid_casts(df, 'interpolate_to_grid'),
+        'pressure': pressure_gridder,
+        'binning': lambda df: grid_casts(df, 'bin_to_grid'),
+    }
+    totals = dict.fromkeys(methods, 0.0)
+    for data_path in sorted(l0_dir.rglob("*.txt")):
+        df = casts(data_path, copies)
+        line = f"{data_path.name:<45} {len(df):>7} rows {df['cast'].nunique():>3} casts"
+        for name, method in methods.items():
+            elapsed = best_of(lambda: method(df), repeat)
+            totals[name] += elapsed
+            line += f"  {name}: {elapsed * 1000:8.1f} ms"
+        print(line)
+
+    print("\nTotal:")
+    for name, total in totals.items():
+        print(f"  {name:<12} {total * 1000:8.1f} ms  (x{totals['interpolate'] / total:.1f})")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    copies = 1
+    if '--repeat' in args:
+        i = args.index('--repeat')
+        copies = int(args[i + 1])
+        del args[i:i + 2]
+    main(Path(args[0]) if args else Path("data/lexplore/Level0"), copies=copies)
@@ -0,0 +1,69 @@
+"""Compare the schema-driven Profile.load against the original inferring loader.
+
+Run from the repository root:
+    python scripts/benchmark_load.py [data/lexplore/Level0]
+"""
+from pathlib import Path
+import sys
+import time
+import pandas as pd
+# Add src to path
+src_dir = Path(__file__).resolve().parent.parent / 'src'
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from core.profile import Profile
+from core.schema import L0_FLOAT_COLUMNS
+
+
+def legacy_load(data_path: Path) -> pd.DataFrame:
+    """Loader as it was before the L0 schema: full inference and guessed datetime format"""
+    df = pd.read_csv(data_path, sep='\t')
+    df['datetime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'])
+    return df
+
+
+def best_of(func, repeat: int) -> float:
+    """Best wall time of `repeat` calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(l0_dir: Path, repeat: int = 5):
+    loaders = {
+        'legacy': legacy_load,
+        'schema (c)': lambda p: Profile(p).load(engine='c')[0],
+    }
+    try:
+        import pyarrow  # noqa: F401
+        loaders['schema (pyarrow)'] = lambda p: Profile(p).load(engine='pyarrow')[0]
+    except ImportError:
+        print("pyarrow not installed, skipping the pyarrow engine")
+
+    totals = {name: 0.0 for name in loaders}
+    for data_path in sorted(l0_dir.rglob("*.txt")):
+        reference = legacy_load(data_path)
+        # The legacy loader leaves columns containing 'NAN' as strings; the cleaner
+        # coerced them later, so compare against the coerced values
+        reference = reference.apply(lambda col: pd.to_numeric(col, errors='coerce')
+                                    if col.name in L0_FLOAT_COLUMNS else col)
+        line = f"{data_path.name:<45} {len(reference):>7} rows"
+        for name, loader in loaders.items():
+            if loader is not legacy_load:
+                pd.testing.assert_frame_equal(loader(data_path), reference, check_dtype=False)
+            elapsed = best_of(lambda: loader(data_path), repeat)
+            totals[name] += elapsed
+            line += f"  {name}: {elapsed * 1000:7.1f} ms"
+        print(line)
+
+    print("\nTotal:")
+    for name, total in totals.items():
+        print(f"  {name:<18} {total * 1000:8.1f} ms  (x{totals['legacy'] / total:.2f})")
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else Path("data/lexplore/Level0"))
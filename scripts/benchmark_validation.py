@@ -0,0 +1,93 @@
+"""Compare the compiled validator against the per-column DataCleaner.validate_data.
+
+Frames are read with every L0 column (wide frames); `--widen N` also repeats
+the validation rules over N copies of the validated columns to mimic wider
+configurations.
+
+Run from the repository root:
+    python scripts/benchmark_validation.py [data/lexplore/Level0] [--widen N]
+"""
+from pathlib import Path
+import sys
+import time
+import pandas as pd
+# Add src to path
+src_dir = Path(__file__).resolve().parent.parent / 'src'
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from core.profile import Profile
+from preprocessing.cleaner import DataCleaner
+from preprocessing.validation import CompiledValidator
+from process_profiles import VALIDATION_CONFIG
+
+
+def widen(df: pd.DataFrame, config: dict, copies: int):
+    """Frame and configuration with `copies` renamed copies of every validated column"""
+    if copies <= 1:
+        return df, config
+    wide_config = {'standard_ranges': dict(config['standard_ranges']),
+                   'gas_rules': dict(config['gas_rules'])}
+    extra = []
+    for i in range(1, copies):
+        names = {}
+        for col, bounds in config['standard_ranges'].items():
+            names[col] = f"{col}#{i}"
+            wide_config['standard_ranges'][f"{col}#{i}"] = bounds
+        for gas, rules in config['gas_rules'].items():
+            names[gas] = f"{gas}#{i}"
+            names[f"{gas}_RSD"] = f"{gas}#{i}_RSD"
+            wide_config['gas_rules'][f"{gas}#{i}"] = rules
+        present = [col for col in names if col in df.columns]
+        extra.append(df[present].rename(columns=names))
+    return pd.concat([df] + extra, axis=1), wide_config
+
+
+def best_of(func, repeat: int) -> float:
+    """Best wall time of `repeat` calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(l0_dir: Path, copies: int = 1, repeat: int = 5):
+    totals = {'per-column': 0.0, 'compiled': 0.0}
+    validator = None
+    for data_path in sorted(l0_dir.rglob("*.txt")):
+        df, _ = Profile(data_path).load()
+        DataCleaner(df).calculate_rsd(VALIDATION_CONFIG['gas_rules'].keys())
+        df, config = widen(df, VALIDATION_CONFIG, copies)
+        if validator is None:
+            validator = CompiledValidator(config)
+
+        expected = DataCleaner(None).validate_data(config, df=df.copy())
+        result = DataCleaner(None).validate_data(validator, df=df.copy())
+        pd.testing.assert_frame_equal(result, expected)
+
+        per_column = best_of(lambda: DataCleaner(None).validate_data(config, df=df.copy()), repeat)
+        compiled = best_of(lambda: DataCleaner(None).validate_data(validator, df=df.copy()), repeat)
+        # The frame copy is timed in both cases, subtract it
+        copy = best_of(df.copy, repeat)
+        totals['per-column'] += per_column - copy
+        totals['compiled'] += compiled - copy
+        print(f"{data_path.name:<45} {len(df):>7} rows x {df.shape[1]:>4} cols  "
+              f"per-column: {(per_column - copy) * 1000:7.1f} ms  "
+              f"compiled: {(compiled - copy) * 1000:7.1f} ms")
+
+    print("\nTotal:")
+    for name, total in totals.items():
+        print(f"  {name:<12} {total * 1000:8.1f} ms  (x{totals['per-column'] / total:.2f})")
+    print(validator.summary())
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    copies = 1
+    if '--widen' in args:
+        i = args.index('--widen')
+        copies = int(args[i + 1])
+        del args[i:i + 2]
+    main(Path(args[0]) if args else Path("data/lexplore/Level0"), copies=copies)
@@ -1,19 +1,33 @@
 from pathlib import Path
 import xarray as xr
 import pandas as pd
-from typing import Dict, List
+import numpy as np
+from typing import Dict, List, Iterator, NamedTuple, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
 import sys
 import re
+import time
+import traceback
 # Add src to path
 src_dir = Path.cwd().parent / 'src'
 if str(src_dir) not in sys.path:
     sys.path.insert(0, str(src_dir))
 
-from core.profile import Profile
+from core.profile import Profile, ProfileTail
+from core.cache import ParsedFrameCache, hash_file
+from core.catalog import ExpeditionCatalog
+from core.manifest import ProcessingManifest, fingerprint
+from core.data_model import GAS_TYPES, SubOceanMetadata
+from core.schema import L0_SCHEMA_VERSION
 from preprocessing.cleaner import DataCleaner
+from preprocessing.qc_flags import QCFlags, QC_FLAG_COLUMN, QC_FLAG_DTYPE
+from preprocessing.validation import CompiledValidator
+from preprocessing.qartod import SensorTests
+from preprocessing.quality_report import QualityReport
 from preprocessing.derived_parameters import DerivedParameters
-from preprocessing.depth_gridder import DepthGridder_xr
-from profile_plot import create_measurement_plot, create_diagnostic_plot, group_related_parameters
+from preprocessing.depth_gridder import DepthGridder_xr, DepthBinAccumulator, DepthGrid, L3BBuilder, stack_profiles
+from profile_plot import create_measurement_plot, create_diagnostic_plot, group_related_parameters, DIAGNOSTIC_PARAMS
 
 # Unified validation configuration
 VALIDATION_CONFIG = {
@@ -52,6 +66,117 @@ VALIDATION_CONFIG = {
     }
 }
 
+# Compiled once, shared by every profile of the run
+VALIDATOR = CompiledValidator(VALIDATION_CONFIG)
+
+# QARTOD-style sensor tests, thresholds in the channel's unit (per second for
+# rate_of_change, per meter for gradient); flat_line counts 1 Hz samples
+GAS_SENSOR_TESTS = {
+    '[CH4] dissolved with water vapour (ppm)': {
+        'spike': 10, 'rate_of_change': 20, 'flat_line': {'count': 30, 'tolerance': 0}, 'gradient': 200,
+    },
+    '[N2O] dissolved with water vapour (ppm)': {
+        'spike': 50, 'rate_of_change': 100, 'flat_line': {'count': 30, 'tolerance': 0}, 'gradient': 1000,
+    },
+}
+SENSOR_TEST_CONFIG = {
+    **GAS_SENSOR_TESTS,
+    'Cellule Temperature (Degree Celsius)': {
+        'spike': 0.05, 'rate_of_change': 0.1, 'flat_line': {'count': 60, 'tolerance': 0},
+    },
+    'Cavity Pressure (mbar)': {
+        'spike': 0.05, 'rate_of_change': 0.1, 'flat_line': {'count': 300, 'tolerance': 0},
+    },
+    'Hydrostatic pressure (bar)': {
+        'spike': 0.05, 'rate_of_change': 0.1, 'flat_line': {'count': 600, 'tolerance': 0}, 'gradient': 0.2,
+    },
+}
+SENSOR_TESTS = SensorTests(SENSOR_TEST_CONFIG)
+
+def qc_layout(validator: CompiledValidator) -> QCFlags:
+    """QC word layout of every rule of `validator` and SENSOR_TESTS, in config order"""
+    return QCFlags.from_rules({**validator.rules, **SENSOR_TESTS.rules})
+
+# One bit per configured rule, the same in every profile whatever columns it
+# holds; raises at import if the rules do not fit in the QC word
+QC_FLAGS = qc_layout(VALIDATOR)
+
+# Columns kept in the L1-L3 products and plots although no processing stage reads them.
+# Together with the stage columns they cover every column of L0_SCHEMA, so by
+# default the column projection of Profile.load skips nothing but columns unknown
+# to the schema and saves no parse time. The saving (about a third of the load
+# time on lexplore with the stage columns alone) needs a narrower list, passed as
+# process_profile(export_columns=...), at the cost of those columns in the products.
+EXPORT_COLUMNS = [
+    'Date calibrated',
+    'Time calibrated',
+    'Hydrostatic Pressure Calibrated (bar)',
+    'Carrier gas pressure calibrated (bar)',
+    'Carrier gas pressure (dbar)',
+    '[CH4] dissolved with water vapour (ppm)',
+    '[CH4] dissolved with water vapour (nmol/L)',
+    '[CH4] dissolved with constant dry gas flow (ppm)',
+    '[CH4] dissolved with constant dry gas flow (nmol/L)',
+    '[N2O] dissolved with water vapour (ppm)',
+    '[N2O] dissolved with water vapour (nmol/L)',
+    '[N2O] dissolved with constant dry gas flow (ppm)',
+    '[N2O] dissolved with constant dry gas flow (nmol/L)',
+    '[NH3] dissolved (ppm)',
+    '[C2H6] dissolved (ppm)',
+    'Delta 13 CH4 (per-mille)',
+    '[CH4] measured (ppm)',
+    '[N2O] measured (ppm)',
+    '[NH3] measured (ppm)',
+    '[C13] measured (ppm)',
+    '[C2H6] measured (ppm)',
+] + DIAGNOSTIC_PARAMS
+
+# Columns read by the gridding step
+GRIDDING_COLUMNS = ['Depth (meter)']
+
+# Expedition-wide L3 depth grid: every cast is binned on it, so L3B stacks the
+# profiles by index. It starts at the shallowest valid depth; depth_max=None
+# takes the deepest profile of the expedition catalog, whose depths are
+# median-filtered so a single bad sample cannot inflate the grid.
+L3_DEPTH_GRID = {
+    'depth_min': VALIDATION_CONFIG['standard_ranges']['Depth (meter)'][0],
+    'depth_max': None,
+    'depth_interval': 0.05,
+}
+
+# Bump when a code change alters the outputs, so that the next run of main
+# reprocesses every profile instead of keeping those listed in the manifest
+PIPELINE_VERSION = '4'
+
+# Worker processes used by main (1 processes the profiles in this process)
+JOBS = min(4, os.cpu_count() or 1)
+
+def expedition_depth_grid(catalog: Optional[ExpeditionCatalog] = None,
+                          grid_config: Dict = L3_DEPTH_GRID) -> DepthGrid:
+    """Shared L3 depth grid from the config, sized from the catalog unless depth_max is set"""
+    depth_max = grid_config.get('depth_max')
+    if depth_max is None and catalog is not None:
+        depth_max = catalog.deepest()
+    if depth_max is None:
+        raise ValueError("Set L3_DEPTH_GRID['depth_max'] or pass a built catalog")
+    return DepthGrid.from_range(grid_config['depth_min'], depth_max, grid_config['depth_interval'])
+
+def pipeline_columns(validation_config: Dict = VALIDATION_CONFIG,
+                     export_columns: Optional[List[str]] = EXPORT_COLUMNS) -> Optional[List[str]]:
+    """Union of the columns each stage of process_profile reads, plus the export columns
+    
+    Returns None (load every column) when export_columns is None. With the
+    default EXPORT_COLUMNS the union is the whole L0 schema.
+    """
+    if export_columns is None:
+        return None
+    columns = (DataCleaner.required_columns(validation_config)
+               + SENSOR_TESTS.required_columns()
+               + DerivedParameters.REQUIRED_COLUMNS
+               + GRIDDING_COLUMNS
+               + list(export_columns))
+    return list(dict.fromkeys(columns))
+
 def save_metadata_csv(metadata: dict, output_path: Path) -> None:
     """Save metadata as CSV file"""
     # Convert metadata dict to DataFrame
@@ -105,42 +230,71 @@ def clean_column_names(df):
         clean_cols[col] = clean
     return df.rename(columns=clean_cols)
 
-def process_profile(data_path: Path, log_path: Path, output_dirs: Dict[str, Path], expedition_name: str) -> Dict[str, Path]:
-    """Process SubOcean profile through pipeline"""
-    # 1. Load Data
-    profile = Profile(data_path, log_path)
-    df, metadata = profile.load()
+def process_levels_1_2(profile: Profile, paths: Dict[str, Path], expedition_name: str,
+                       cache: Optional[ParsedFrameCache] = None,
+                       export_columns: Optional[List[str]] = EXPORT_COLUMNS,
+                       validator: CompiledValidator = VALIDATOR,
+                       copy: bool = True,
+                       stage_cache: Optional[ParsedFrameCache] = None,
+                       keys: Optional[Dict[str, str]] = None) -> Tuple[pd.DataFrame, SubOceanMetadata]:
+    """L1A to L2B stages of process_profile, writing their products to `paths`
+    
+    Returns the L2 frame and the profile metadata. With a `stage_cache`, the
+    RSD-annotated frame is read from it when its key (in `keys`) is known,
+    and the RSD and L2 frames are added to it otherwise.
+    """
+    data_path = profile.data_path
+    qc_flags = QC_FLAGS if validator is VALIDATOR else qc_layout(validator)
+    df = stage_cache.get(keys['RSD']) if stage_cache is not None else None
+    if df is not None:
+        metadata = profile.load_metadata()
+        cleaner = DataCleaner(df, packed_flags=True, qc_flags=qc_flags)
+    else:
+        # 1. Load Data (memory-mapped from the cache if the file was parsed before)
+        df, metadata = profile.load(cache=cache, usecols=pipeline_columns(VALIDATION_CONFIG, export_columns))
+        cleaner = DataCleaner(df, packed_flags=True, qc_flags=qc_flags)
+        # Calculate RSD and update flags
+        df = cleaner.calculate_rsd(VALIDATION_CONFIG['gas_rules'].keys())
+        if stage_cache is not None:
+            stage_cache.put(keys['RSD'], df)
     # 4. Data Cleaning
-    cleaner = DataCleaner(df)
-    # Calculate RSD and update flags
-    df = cleaner.calculate_rsd(VALIDATION_CONFIG['gas_rules'].keys())
     # Apply validation ranges
-    df = cleaner.validate_data(VALIDATION_CONFIG)
+    df = cleaner.validate_data(validator)
+    # Spike, rate-of-change, flat-line and gradient tests
+    df = cleaner.apply_sensor_tests(SENSOR_TESTS)
+    # Bit layout of the packed QC_FLAGS column, stored next to every product
+    flag_attrs = cleaner.qc_flags.to_attrs()
+    flag_metadata = {**parse_metadata(metadata),
+                     'qc_flag_masks': ' '.join(str(m) for m in flag_attrs['flag_masks']),
+                     'qc_flag_meanings': flag_attrs['flag_meanings']}
     # Export L1A (raw data with flags)
-    l1a_path = output_dirs["L1"]/f"L1A_{data_path.stem}.csv"
+    l1a_path = paths["L1A"]
     df.to_csv(l1a_path, index=False)
-    save_metadata_csv(metadata, l1a_path)
+    save_metadata_csv(flag_metadata, l1a_path)
     
     # Create L1B by applying column-specific flags
     # Apply row-wise filtering based on gas measurements
-    cleaner.filter_flagged_row()
+    # (in place: L1A is already written, so the frame is not copied)
+    cleaner.filter_flagged_row(inplace=True)
     #Strong filter that removes all rows with flagged gas measurements
-    cleaner.filter_flagged_rows(columns_to_check=['Error Standard'])
-    l1b_path = output_dirs["L1"]/ f"L1B_{data_path.stem}.csv"
+    cleaner.filter_flagged_rows(columns_to_check=['Error Standard'], inplace=True)
+    l1b_path = paths["L1B"]
     cleaner.df.to_csv(l1b_path, index=False)
-    save_metadata_csv(metadata, l1b_path)
+    save_metadata_csv(flag_metadata, l1b_path)
 
     
-    derived = DerivedParameters(cleaner.df)
+    derived = DerivedParameters(cleaner.df, copy=copy)
     df = derived.calculate_all()
+    if stage_cache is not None:
+        stage_cache.put(keys['L2'], df)
     
     # Export L2A as CSV with metadata and expedition name
-    l2a_path = output_dirs["L2A"] / f"L2A_{expedition_name}_{data_path.stem}.csv"
+    l2a_path = paths["L2A"]
     df.to_csv(l2a_path, index=False)
-    save_metadata_csv(metadata, l2a_path)
+    save_metadata_csv(flag_metadata, l2a_path)
     
     # Export L2B as NetCDF with cleaned column names
-    l2b_path = output_dirs["L2B"] / f"L2B_{expedition_name}_{data_path.stem}.nc"
+    l2b_path = paths["L2B"]
     
     # Clean DataFrame column names before converting to xarray
     df_clean = clean_column_names(df)
@@ -148,10 +302,13 @@ def process_profile(data_path: Path, log_path: Path, output_dirs: Dict[str, Path
     
     # Add metadata as attributes
     ds = add_netcdf_attributes(ds, metadata, expedition_name)
+    if QC_FLAG_COLUMN in ds:
+        ds[QC_FLAG_COLUMN] = ds[QC_FLAG_COLUMN].astype(QC_FLAG_DTYPE)
+        ds[QC_FLAG_COLUMN].attrs.update(flag_attrs)
     ds.to_netcdf(l2b_path)
     
     # Create plots directory
-    plots_dir = output_dirs["figures"] / "plots"
+    plots_dir = paths["measurements"].parent
     plots_dir.mkdir(parents=True, exist_ok=True)
     
     # Generate and save plots
@@ -164,54 +321,190 @@ def process_profile(data_path: Path, log_path: Path, output_dirs: Dict[str, Path
         
         # Generate and save measurement plot
         fig_meas = create_measurement_plot(df, param_groups, timestamp)
-        meas_path = plots_dir / f"{data_path.stem}_measurements.html"
-        fig_meas.write_html(str(meas_path))
+        fig_meas.write_html(str(paths["measurements"]))
         
         # Generate and save diagnostic plot
         fig_diag = create_diagnostic_plot(df, diag_params, timestamp)
-        diag_path = plots_dir / f"{data_path.stem}_diagnostics.html"
-        fig_diag.write_html(str(diag_path))
+        fig_diag.write_html(str(paths["diagnostics"]))
         
     except Exception as e:
         print(f"Error creating plots for {data_path.stem}: {str(e)}")
+    return df, metadata
+
+def process_profile(data_path: Path, log_path: Path, output_dirs: Dict[str, Path], expedition_name: str,
+                    cache: Optional[ParsedFrameCache] = None,
+                    export_columns: Optional[List[str]] = EXPORT_COLUMNS,
+                    validator: CompiledValidator = VALIDATOR,
+                    report: Optional[QualityReport] = None,
+                    copy: bool = True,
+                    l3a_median: bool = False,
+                    depth_grid: Optional[DepthGrid] = None,
+                    l3b: Optional[Dict[Tuple[str, str], L3BBuilder]] = None,
+                    write_l3a: bool = True,
+                    stage_cache: Optional[ParsedFrameCache] = None,
+                    previous_stages: Optional[Dict[str, str]] = None) -> Dict[str, Path]:
+    """Process SubOcean profile through pipeline
+    
+    Only the columns the stages read plus `export_columns` are loaded
+    (the default EXPORT_COLUMNS keep every schema column, see there);
+    pass export_columns=None to carry every L0 column through. When a
+    `report` is given, the L2A statistics of the profile are added to it.
+    With copy=False the derived parameters share the columns of the L1B
+    frame instead of copying it (see DerivedParameters). L3A holds the
+    bin mean, sample count and standard deviation of every variable, and
+    the median with l3a_median=True. Casts are binned on their stretch of
+    `depth_grid` (see expedition_depth_grid), or on a 5 cm grid of their
+    own depth range when it is None.
+    
+    When an `l3b` dict is given, every gridded cast is also appended to
+    its L3BBuilder, keyed by (gas type, 'downcast'/'upcast') and created
+    on `depth_grid` as needed; with write_l3a=False no L3A file is
+    written and the builders are the only L3 output.
+    
+    With a `stage_cache`, the RSD-annotated frame and the L2 frame are
+    cached under their stage_keys: a new QC threshold reuses the parsed
+    frame and its RSD, and when `previous_stages` (the stage keys the
+    existing L1/L2 files were written with, see ProcessingManifest) has the
+    same L2 key, only the gridding runs again, from the cached L2 frame.
+    """
+    if l3b is not None and depth_grid is None:
+        raise ValueError("Building L3B in memory needs a shared depth_grid")
+    keys = None
+    if stage_cache is not None:
+        keys = stage_keys(hash_file(data_path), hash_file(log_path), export_columns, depth_grid, l3a_median)
+    paths = {
+        "L1A": output_dirs["L1"] / f"L1A_{data_path.stem}.csv",
+        "L1B": output_dirs["L1"] / f"L1B_{data_path.stem}.csv",
+        "L2A": output_dirs["L2A"] / f"L2A_{expedition_name}_{data_path.stem}.csv",
+        "L2B": output_dirs["L2B"] / f"L2B_{expedition_name}_{data_path.stem}.nc",
+        "measurements": output_dirs["figures"] / "plots" / f"{data_path.stem}_measurements.html",
+        "diagnostics": output_dirs["figures"] / "plots" / f"{data_path.stem}_diagnostics.html",
+    }
+    
+    profile = Profile(data_path, log_path)
+    df = None
+    if (keys is not None and previous_stages is not None and previous_stages.get('L2') == keys['L2']
+            and all(paths[level].exists() for level in ["L1A", "L1B", "L2A", "L2B"])):
+        # The L1/L2 files already hold these inputs and settings
+        df = stage_cache.get(keys['L2'])
+    if df is not None:
+        metadata = profile.load_metadata()
+    else:
+        df, metadata = process_levels_1_2(profile, paths, expedition_name, cache, export_columns,
+                                          validator, copy, stage_cache, keys)
+    if report is not None:
+        report.add(data_path.stem, df, gas_type=GAS_TYPES[metadata.gas_type],
+                   start_time=metadata.start_time)
     
     # Clean profile name for NetCDF
     clean_profile_name = clean_string_for_netcdf(data_path.stem)
     
-    # Separate and save casts
+    # Grid and save every cast of the record (several for yo-yo profiles)
     l3a_paths = {}
-    for cast_type in ['downcast', 'upcast']:
-        # Split cast
-        mask = df['is_downcast'] if cast_type == 'downcast' else ~df['is_downcast']
-        cast_df = df[mask].copy()
+    for (cast, is_downcast), cast_df in df.groupby(['cast', 'is_downcast'], sort=True):
+        cast_type = 'downcast' if is_downcast else 'upcast'
+        # Flag words are not averaged onto the depth grid
+        cast_df = cast_df.drop(columns=[QC_FLAG_COLUMN, 'cast'], errors='ignore')
         
-        if not cast_df.empty:
-            # Clean variable names
-            cast_df.columns = [clean_string_for_netcdf(col) for col in cast_df.columns]
-            
-            # Grid the cast along depth
-            gridder = DepthGridder_xr(cast_df, profile_name=clean_profile_name)
-            ds = gridder.interpolate_to_grid(depth_interval=0.05)  # Grid every 5cm
-            
-            # Save L3A file
-            output_path = output_dirs["L3A"] / f"L3A_{expedition_name}_{clean_profile_name}_{cast_type}.nc"
+        # Clean variable names
+        cast_df.columns = [clean_string_for_netcdf(col) for col in cast_df.columns]
+        
+        # Average the cast in depth bins
+        gridder = DepthGridder_xr(cast_df, profile_name=clean_profile_name)
+        ds = gridder.bin_to_grid(depth_interval=0.05, median=l3a_median, grid=depth_grid)  # Grid every 5cm
+        ds.attrs['cast'] = int(cast)
+        
+        if l3b is not None:
+            key = (GAS_TYPES[metadata.gas_type], cast_type)
+            if key not in l3b:
+                # Grown to the casts of this profile only: the rows are pickled back from workers
+                l3b[key] = L3BBuilder(depth_grid, capacity=1)
+            l3b[key].add(l3_profile_id(ds), ds, cast=int(cast),
+                         start_time=pd.Timestamp(metadata.start_time))
+        
+        # Save L3A file
+        if write_l3a:
+            output_path = output_dirs["L3A"] / f"L3A_{expedition_name}_{clean_profile_name}_c{cast:02d}_{cast_type}.nc"
             ds.to_netcdf(output_path)
-            l3a_paths[cast_type] = output_path
+            l3a_paths[(int(cast), cast_type)] = output_path
     
     return {
-        "L1A": l1a_path,
-        "L1B": l1b_path,
-        "L2A": l2a_path,
-        "L2B": l2b_path,
+        "L1A": paths["L1A"],
+        "L1B": paths["L1B"],
+        "L2A": paths["L2A"],
+        "L2B": paths["L2B"],
         "L2_plots": {
-            "measurements": meas_path,
-            "diagnostics": diag_path
+            "measurements": paths["measurements"],
+            "diagnostics": paths["diagnostics"]
         },
         "L3A": l3a_paths
     }
 
-def combine_l3_profiles(l3a_dir: Path, cast_type: str = 'downcast') -> xr.Dataset:
-    """Combine L3A profiles into L3B dataset, searching in all subdirectories"""
+def follow_profile(data_path: Path, interval: float = 5.0,
+                   depth_interval: float = 0.05,
+                   max_updates: Optional[int] = None) -> Iterator[Dict[str, xr.Dataset]]:
+    """
+    Follow an L0 file while the instrument is logging and yield a quicklook grid
+    
+    Every `interval` seconds only the newly appended lines are parsed, then pushed
+    through RSD, validation, flag filtering, flow calculations and depth binning,
+    so each refresh costs the same however long the cast already is. Steps that
+    need the whole record (H2O moving average, cast segmentation) are
+    left to process_profile once the file is complete.
+    
+    Yields
+    ------
+    Dict[str, xr.Dataset]
+        Depth-binned means for 'downcast' and 'upcast' after each refresh
+    """
+    tail = ProfileTail(data_path)
+    cleaner = DataCleaner(None)
+    derived = DerivedParameters()
+    profile_name = clean_string_for_netcdf(Path(data_path).stem)
+    bins = {
+        cast_type: DepthBinAccumulator(depth_interval=depth_interval, profile_name=profile_name)
+        for cast_type in ['downcast', 'upcast']
+    }
+    last_pressure = np.nan
+    
+    updates = 0
+    while max_updates is None or updates < max_updates:
+        if updates:
+            time.sleep(interval)
+        updates += 1
+        
+        chunk = tail.read_new()
+        if not chunk.empty:
+            cleaner.calculate_rsd(VALIDATION_CONFIG['gas_rules'].keys(), df=chunk)
+            cleaner.validate_data(VALIDATOR, df=chunk)
+            cleaner.df = chunk
+            cleaner.filter_flagged_row(inplace=True)
+            chunk = cleaner.filter_flagged_rows(columns_to_check=['Error Standard'], inplace=True)
+            derived.calculate_flows(df=chunk)
+            
+            # Direction from the pressure gradient, carried over between chunks
+            pressure = chunk['Hydrostatic pressure (bar)'].ffill().fillna(last_pressure)
+            is_downcast = pressure.diff().fillna(pressure.iloc[0] - last_pressure) > 0
+            if pressure.notna().any():
+                last_pressure = pressure.dropna().iloc[-1]
+            bins['downcast'].update(chunk[is_downcast])
+            bins['upcast'].update(chunk[~is_downcast])
+        
+        yield {cast_type: acc.to_dataset() for cast_type, acc in bins.items()}
+
+def l3_profile_id(ds: xr.Dataset) -> str:
+    """L3B profile label of a gridded cast: profile name and cast index"""
+    return f"{ds.attrs['profile_name']}_c{ds.attrs['cast']:02d}"
+
+def combine_l3_profiles(l3a_dir: Path, cast_type: str = 'downcast',
+                        depth_grid: Optional[DepthGrid] = None) -> Dict[str, xr.Dataset]:
+    """Combine L3A profiles into L3B dataset, searching in all subdirectories
+    
+    Profiles are copied by index into a preallocated (profile x depth)
+    array on `depth_grid` (see stack_profiles). Without a grid, one
+    spanning all the L3A files of the gas type is used. The in-memory
+    L3BBuilder of process_profile gives the same dataset without L3A files.
+    """
     # Use rglob to search recursively
     l3a_files = list(l3a_dir.rglob(f"L3A_*_{cast_type}.nc"))
     if not l3a_files:
@@ -229,19 +522,27 @@ def combine_l3_profiles(l3a_dir: Path, cast_type: str = 'downcast') -> xr.Datase
     # Process each gas type separately
     combined_datasets = {}
     for gas_type, files in gas_groups.items():
-        datasets = []
-        for file in files:
-            ds = xr.open_dataset(file)
-            my_lst = file.stem.split("_")[:-1]
-            profile_id = '_'.join(map(str, my_lst))
-            # Add gas type to profile metadata
-            ds.attrs['gas_type'] = gas_type
-            # Create profile dimension
-            ds = ds.expand_dims({'profile': [profile_id]})
-            datasets.append(ds)
+        datasets = {}
+        for file in sorted(files):
+            with xr.open_dataset(file) as ds:
+                ds = ds.load()
+            if 'cast' in ds.attrs:
+                profile_id = l3_profile_id(ds)
+            else:
+                # L3A files from before the cast segmentation
+                profile_id = '_'.join(file.stem.split("_")[:-1])
+            datasets[profile_id] = ds
         
-        if datasets:
-            combined_datasets[gas_type] = xr.concat(datasets, dim='profile')
+        grid = depth_grid
+        if grid is None:
+            depths = [ds['Depth__meter_'].values for ds in datasets.values()]
+            grid = DepthGrid.from_range(min(d.min() for d in depths), max(d.max() for d in depths),
+                                        next(iter(datasets.values())).attrs['depth_interval'])
+        combined = stack_profiles(datasets, grid)
+        # Add gas type to profile metadata
+        combined.attrs['gas_type'] = gas_type
+        combined.attrs['depth_interval'] = grid.depth_interval
+        combined_datasets[gas_type] = combined
     
     return combined_datasets
 
@@ -264,7 +565,194 @@ def clean_string_for_netcdf(s: str) -> str:
         clean = 'p' + clean
     return clean
 
-def main(expedition_name: str):
+class ExpeditionRun(NamedTuple):
+    """Merged outputs of run_profiles"""
+    report: QualityReport
+    l3b: Dict[Tuple[str, str], L3BBuilder]
+    timings: pd.DataFrame   # one row per profile: worker, rows, seconds, error
+
+def stage_keys(data_hash: str, log_hash: str, export_columns: Optional[List[str]] = EXPORT_COLUMNS,
+               depth_grid: Optional[DepthGrid] = None, l3a_median: bool = False) -> Dict[str, str]:
+    """Fingerprint of the inputs of every stage of process_profile, each chained to the stage before
+    
+    Every stage only hashes its own slice of the settings: a QC threshold
+    changes the L1 key but not the RSD key (parsed and RSD-annotated frame),
+    a gridding setting only changes the L3 key.
+    """
+    # Columns loaded and RSD columns added; thresholds are not used yet
+    rsd = fingerprint(PIPELINE_VERSION, L0_SCHEMA_VERSION, data_hash,
+                      pipeline_columns(VALIDATION_CONFIG, export_columns), list(VALIDATION_CONFIG['gas_rules']))
+    l1 = fingerprint(rsd, log_hash, VALIDATION_CONFIG, SENSOR_TEST_CONFIG)
+    # DerivedParameters has no settings of its own: its code is covered by PIPELINE_VERSION
+    l2 = fingerprint(l1)
+    # A cast only covers its stretch of the grid, so the grid size does not change L3A
+    grid = None if depth_grid is None else (depth_grid.depth_min, depth_grid.depth_interval)
+    l3 = fingerprint(l2, grid, l3a_median)
+    return {'RSD': rsd, 'L1': l1, 'L2': l2, 'L3': l3}
+
+def output_files(outputs: Dict) -> List[Path]:
+    """Flat list of the files in a process_profile result"""
+    files = []
+    for value in outputs.values():
+        files.extend(output_files(value) if isinstance(value, dict) else [value])
+    return files
+
+def _run_profile(data_path: Path, log_path: Path, output_dirs: Dict[str, Path],
+                 expedition_name: str, **options) -> Dict:
+    """process_profile with its report and L3B rows collected locally, errors caught
+    
+    Runs in the worker processes of run_profiles; the returned dict is
+    merged in the parent.
+    """
+    report = QualityReport()
+    # L3B rows need the shared grid
+    l3b = {} if options.get('depth_grid') is not None else None
+    validated = dict(VALIDATOR.stats)
+    start = time.perf_counter()
+    outputs = None
+    try:
+        outputs = process_profile(data_path, log_path, output_dirs, expedition_name,
+                                  report=report, l3b=l3b, **options)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return {
+        'worker': os.getpid(),
+        'seconds': time.perf_counter() - start,
+        'error': error,
+        'report': report,
+        'l3b': l3b or {},
+        'outputs': outputs,
+        'validated': {k: VALIDATOR.stats[k] - validated[k] for k in validated},
+    }
+
+def _reuse_profile(entry: Dict, table: pd.DataFrame, depth_grid: DepthGrid) -> Dict:
+    """_run_profile result of an up-to-date profile, from its saved report rows and L3A files"""
+    report, l3b = QualityReport(), {}
+    report.add_table(table)
+    for cast, cast_type, path in entry['l3a']:
+        key = (entry['gas_type'], cast_type)
+        if key not in l3b:
+            l3b[key] = L3BBuilder(depth_grid, capacity=1)
+        with xr.open_dataset(path) as ds:
+            ds = ds.load()
+        l3b[key].add(l3_profile_id(ds), ds, cast=cast, start_time=pd.Timestamp(entry['start_time']))
+    return {'worker': None, 'seconds': 0.0, 'error': None, 'report': report, 'l3b': l3b}
+
+def run_profiles(profiles: pd.DataFrame, l0_dir: Path, output_dirs: Dict[str, Path],
+                 expedition_name: str, jobs: int = 1,
+                 manifest: Optional[ProcessingManifest] = None,
+                 previous_report: Optional[pd.DataFrame] = None, **options) -> ExpeditionRun:
+    """
+    Process catalog profiles with a pool of `jobs` worker processes
+    
+    The largest files are submitted first so that no long profile starts
+    last. Each worker fills its own report and L3B rows, which are merged
+    in the order of `profiles`, so the outputs do not depend on `jobs` or
+    on which worker finishes first. A profile that raises is reported and
+    left out; the others are still processed.
+    
+    With a `manifest`, profiles whose stage keys (see stage_keys) are
+    unchanged and whose outputs exist are not processed again: their L3B
+    rows are read back from their L3A files and their QC rows taken from
+    `previous_report` (the saved QualityReport). The manifest is updated
+    with the profiles processed; it is not used with write_l3a=False, as
+    the L3A files are what makes L3B incremental. The stage keys of a
+    profile's existing files are passed on to process_profile, which with
+    a `stage_cache` option only reruns the stages that changed.
+    
+    Parameters
+    ----------
+    profiles : pd.DataFrame
+        Rows of ExpeditionCatalog.query() (data_path, log_path, n_rows, file_size)
+    l0_dir : Path
+        L0 directory whose layout is mirrored in `output_dirs`
+    **options
+        Passed on to process_profile (cache, depth_grid, write_l3a, ...)
+    """
+    if not options.get('write_l3a', True):
+        manifest = None
+    tasks, keys, results = {}, {}, {}
+    for row in profiles.itertuples():
+        data_path = Path(row.data_path)
+        task_options = dict(options)
+        if manifest is not None:
+            keys[data_path] = stage_keys(row.file_hash, hash_file(row.log_path),
+                                         options.get('export_columns', EXPORT_COLUMNS),
+                                         options.get('depth_grid'), options.get('l3a_median', False))
+            table = (previous_report[previous_report['profile'] == data_path.stem]
+                     if previous_report is not None else pd.DataFrame())
+            if manifest.is_current(str(data_path), keys[data_path]) and len(table):
+                results[data_path] = _reuse_profile(manifest.get(str(data_path)), table,
+                                                    options.get('depth_grid'))
+                continue
+            if manifest.get(str(data_path)) is not None:
+                task_options['previous_stages'] = manifest.get(str(data_path))['stages']
+        rel_path = data_path.relative_to(l0_dir)
+        level_paths = {level: base_dir / rel_path.parent for level, base_dir in output_dirs.items()}
+        tasks[data_path] = ((data_path, Path(row.log_path), level_paths, expedition_name), task_options)
+    
+    if jobs <= 1:
+        for data_path, (args, task_options) in tasks.items():
+            results[data_path] = _run_profile(*args, **task_options)
+    else:
+        largest_first = profiles.sort_values('file_size', ascending=False, kind='stable')['data_path']
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(_run_profile, *tasks[Path(path)][0], **tasks[Path(path)][1]): Path(path)
+                       for path in largest_first if Path(path) in tasks}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    # The worker itself died (e.g. out of memory)
+                    result = {'worker': None, 'seconds': np.nan, 'error': traceback.format_exc(),
+                              'validated': {}}
+                results[futures[future]] = result
+                # Validation statistics are counted in the worker's own VALIDATOR
+                for key, value in result['validated'].items():
+                    VALIDATOR.stats[key] += value
+    
+    report, l3b, timings = QualityReport(), {}, []
+    for row in profiles.itertuples():
+        data_path = Path(row.data_path)
+        result = results[data_path]
+        timings.append({'profile': data_path.stem, 'worker': result['worker'], 'rows': row.n_rows,
+                        'seconds': result['seconds'], 'error': result['error'],
+                        'skipped': data_path not in tasks})
+        if result['error'] is not None:
+            print(f"Error processing {row.data_path}:\n{result['error']}")
+            if manifest is not None:
+                manifest.drop(str(data_path))
+            continue
+        if manifest is not None and data_path in tasks:
+            outputs = result['outputs']
+            manifest.record(str(data_path), keys[data_path], output_files(outputs),
+                            gas_type=row.gas_type, start_time=str(row.start_time),
+                            l3a=[[cast, cast_type, str(path)]
+                                 for (cast, cast_type), path in outputs['L3A'].items()])
+        report.extend(result['report'])
+        for key, builder in result['l3b'].items():
+            if key in l3b:
+                l3b[key].extend(builder)
+            else:
+                l3b[key] = builder
+    return ExpeditionRun(report, l3b, pd.DataFrame(timings))
+
+def worker_summary(timings: pd.DataFrame) -> str:
+    """Profiles, rows and rows/s processed by every worker of a run_profiles call, and the failures"""
+    failed = timings.loc[timings['error'].notna(), 'profile']
+    processed = timings[timings['error'].isna() & ~timings['skipped']]
+    per_worker = processed.groupby('worker').agg(profiles=('profile', 'size'), rows=('rows', 'sum'),
+                                               seconds=('seconds', 'sum'))
+    lines = [f"Worker {int(worker)}: {w.profiles} profiles, {w.rows} rows in {w.seconds:.1f} s "
+             f"({w.rows / w.seconds if w.seconds > 0 else float('nan'):,.0f} rows/s)"
+             for worker, w in zip(per_worker.index, per_worker.itertuples())]
+    lines.append(f"{len(processed)}/{len(timings)} profiles processed, "
+                 f"{int(timings['skipped'].sum())} up to date"
+                 + (f", failed: {', '.join(failed)}" if len(failed) else ""))
+    return '\n'.join(lines)
+
+def main(expedition_name: str, write_l3a: bool = True, jobs: int = JOBS):
     # Base directories
     base_dir = Path.cwd()
     data_dir = base_dir / "data" / expedition_name
@@ -285,6 +773,11 @@ def main(expedition_name: str):
     for dir_path in output_dirs.values():
         dir_path.mkdir(exist_ok=True, parents=True)
     
+    # Parsed L0 frames, keyed by file contents
+    cache = ParsedFrameCache(data_dir / ".cache" / "L0")
+    # RSD-annotated and L2 frames, keyed by their stage inputs (see stage_keys)
+    stage_cache = ParsedFrameCache(data_dir / ".cache" / "stages")
+    
     # Mirror directory structure for both data and figures
     subdirs = [p for p in l0_dir.glob('*') if p.is_dir()]
     for subdir in subdirs:
@@ -295,36 +788,43 @@ def main(expedition_name: str):
         # Create figures subdir
         (figures_dir / subdir_name).mkdir(exist_ok=True, parents=True)
     
-    # Process profiles
-    for data_path in l0_dir.rglob("*.txt"):
-        log_path = data_path.with_suffix('.log')
-        if log_path.exists():
-            rel_path = data_path.relative_to(l0_dir)
-            level_paths = {
-                level: base_dir / rel_path.parent
-                for level, base_dir in output_dirs.items()
-            }
-            process_profile(data_path, log_path, level_paths, expedition_name)
-    '''    
-    # Create L3B combined profiles
-    for cast_type in ['downcast', 'upcast']:
-        # Get combined datasets (dictionary by gas type)
-        combined_datasets = combine_l3_profiles(output_dirs['L3A'], cast_type)
-        
-        # Save each gas type dataset separately
-        for gas_type, dataset in combined_datasets.items():
-            # Create gas type subdirectory in L3B
-            l3b_subdir = output_dirs['L3B'] / gas_type
-            l3b_subdir.mkdir(exist_ok=True, parents=True)
-            
-            # Add metadata as attributes
-            dataset = add_netcdf_attributes(dataset, metadata, expedition_name)
-            
-            # Create output path with gas type
-            output_path = l3b_subdir / f"L3B_{expedition_name}_{gas_type}_{cast_type}.nc"
-            
-            # Save dataset
-            dataset.to_netcdf(output_path)
-            print(f"Saved L3B dataset for {gas_type} to {output_path}")'''
+    # Index the expedition (only new or modified files are read)
+    catalog = ExpeditionCatalog(data_dir / "catalog.sqlite")
+    catalog.build(l0_dir)
+    depth_grid = expedition_depth_grid(catalog)
+    
+    # Profiles already processed with the same inputs and settings are kept
+    manifest = ProcessingManifest(data_dir / "manifest.json")
+    report_path = data_dir / "Level2" / f"L2_{expedition_name}_qc_summary.csv"
+    previous_report = QualityReport.load(report_path) if report_path.exists() else None
+    
+    # Process profiles in parallel, gathering the L3B datasets as the casts are gridded
+    profiles = catalog.query()
+    run = run_profiles(profiles, l0_dir, output_dirs, expedition_name, jobs=jobs,
+                       manifest=manifest, previous_report=previous_report,
+                       cache=cache, stage_cache=stage_cache, depth_grid=depth_grid, write_l3a=write_l3a)
+    report, l3b = run.report, run.l3b
+    print(worker_summary(run.timings))
+    print(VALIDATOR.summary())
+    # Forget profiles removed from the expedition
+    for profile in set(manifest.profiles) - set(profiles['data_path']):
+        manifest.drop(profile)
+    manifest.save()
+    # Per-profile statistics of every L2A variable, read by the dashboards
+    report.save(report_path)
+    
+    # Save one L3B dataset per gas type and cast direction
+    for (gas_type, cast_type), builder in l3b.items():
+        l3b_subdir = output_dirs['L3B'] / gas_type
+        l3b_subdir.mkdir(exist_ok=True, parents=True)
+        # Metadata attributes as on the other levels, from the first profile of the gas type
+        first = profiles[profiles['gas_type'] == gas_type].iloc[0]
+        metadata = Profile(Path(first['data_path']), Path(first['log_path'])).load_metadata()
+        dataset = add_netcdf_attributes(builder.to_dataset(), metadata, expedition_name)
+        dataset.attrs.update({'gas_type': gas_type, 'cast_type': cast_type})
+        output_path = l3b_subdir / f"L3B_{expedition_name}_{gas_type}_{cast_type}.nc"
+        dataset.to_netcdf(output_path)
+        print(f"Saved L3B dataset for {gas_type} ({len(builder)} {cast_type}s) to {output_path}")
+
 if __name__ == "__main__":
     main(expedition_name="forel")
\ No newline at end of file
@@ -4,25 +4,27 @@ import pandas as pd
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+DIAGNOSTIC_PARAMS = [
+    'Cavity Pressure (mbar)', 
+    'Cellule Temperature (Degree Celsius)',
+    'Hydrostatic pressure (bar)', 
+    'LShift', 
+    'Error Standard',
+    'Ringdown Time (microSec)', 
+    'Box Temperature (Degree Celsius)',
+    'Box Pressure (mbar)', 
+    'PWM Cellule Temperature',
+    'PWM Cellule Pressure', 
+    'Laser Temperature (Degree Celsius)',
+    'Laser Flux', 
+    'Norm Signal', 
+    'Value Max'
+]
+
 def group_related_parameters(df: pd.DataFrame) -> Tuple[Dict, List]:
     """Group base parameters with their RSD and corrected versions"""
     param_groups = {}
-    diagnostic_params = [
-        'Cavity Pressure (mbar)', 
-        'Cellule Temperature (Degree Celsius)',
-        'Hydrostatic pressure (bar)', 
-        'LShift', 
-        'Error Standard',
-        'Ringdown Time (microSec)', 
-        'Box Temperature (Degree Celsius)',
-        'Box Pressure (mbar)', 
-        'PWM Cellule Temperature',
-        'PWM Cellule Pressure', 
-        'Laser Temperature (Degree Celsius)',
-        'Laser Flux', 
-        'Norm Signal', 
-        'Value Max'
-    ]
+    diagnostic_params = DIAGNOSTIC_PARAMS
     
     # Filter diagnostic params to only those present in df
     available_diag_params = [p for p in diagnostic_params if p in df.columns]
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+from .schema import L0_SCHEMA_VERSION
+
+# Bump when the entry layout changes, so that older entries are not read
+CACHE_VERSION = 2
+
+
+def hash_file(path: Path, prefix: bytes = b'') -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256(prefix)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024**2), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParsedFrameCache:
+    """
+    Content-addressed on-disk cache of parsed L0 frames
+
+    Each entry is a directory holding one .npy file per column plus a small
+    columns.json (and, for string columns with missing values, a .na.npy
+    mask restoring them as NA), keyed by the hash of the raw file contents and the L0 schema
+    version. Entries are opened with copy-on-write memory maps, so a hit costs
+    no parsing and no copy: pages are only read when used, and only copied if
+    a column is modified in place. The total size is capped; the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 1024**3):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, data_path: Path) -> str:
+        """Hash of the file contents, schema version and cache layout version"""
+        prefix = f"L0 schema v{L0_SCHEMA_VERSION} cache v{CACHE_VERSION}\n"
+        return hash_file(data_path, prefix=prefix.encode())
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Memory-map a cached frame, or None on a miss"""
+        entry = self.cache_dir / key
+        index_path = entry / 'columns.json'
+        if not index_path.exists():
+            return None
+        with open(index_path, 'r') as f:
+            columns = json.load(f)
+
+        data = {}
+        for i, name in enumerate(columns):
+            data[name] = np.load(entry / f"{i:04d}.npy", mmap_mode='c')
+            na_path = entry / f"{i:04d}.na.npy"
+            if na_path.exists():
+                values = data[name].astype(object)
+                values[np.load(na_path)] = None
+                data[name] = pd.array(values, dtype='str')
+        # Mark as recently used for LRU eviction
+        os.utime(index_path)
+        return pd.DataFrame(data, copy=False)
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """Store a frame and evict old entries beyond max_bytes"""
+        entry = self.cache_dir / key
+        # Per-process temporary name: workers may store the same file at once
+        tmp_entry = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir()
+
+        for i, name in enumerate(df.columns):
+            values = df[name].to_numpy()
+            if values.dtype == object:
+                # Strings go to fixed-width unicode so they can be stored without
+                # pickling; missing values are kept in a separate mask
+                missing = pd.isna(values)
+                if missing.any():
+                    np.save(tmp_entry / f"{i:04d}.na.npy", missing, allow_pickle=False)
+                    values = np.where(missing, '', values)
+                values = values.astype(str)
+            np.save(tmp_entry / f"{i:04d}.npy", values, allow_pickle=False)
+        with open(tmp_entry / 'columns.json', 'w') as f:
+            json.dump(list(df.columns), f)
+
+        # Rename last so that readers never see a half-written entry
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            tmp_entry.rename(entry)
+        except OSError:
+            # Another process stored the same contents in the meantime
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict()
+
+    def size(self) -> int:
+        """Total size of the cached entries in bytes"""
+        return sum(f.stat().st_size for f in self.cache_dir.rglob('*') if f.is_file())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        # Entries removed by another process meanwhile are skipped
+        stamps, sizes = {}, {}
+        for p in self.cache_dir.iterdir():
+            try:
+                stamp = (p / 'columns.json').stat().st_mtime
+                sizes[p] = sum(f.stat().st_size for f in p.iterdir())
+                stamps[p] = stamp
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        entries = sorted(stamps, key=stamps.get)
+        total = sum(sizes.values())
+        # Never evict the newest entry, even if it alone exceeds the cap
+        for entry in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
@@ -0,0 +1,187 @@
+import json
+import sqlite3
+import pandas as pd
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from .cache import hash_file
+from .data_model import SubOceanMetadata, GAS_TYPES
+from .schema import L0_SEPARATOR, L0_NA_VALUES
+
+# Bump when the columns or how they are computed change: older catalogs are rebuilt
+CATALOG_VERSION = 2
+
+# Samples of the centered rolling median giving max_depth: a depth counts once
+# most samples of a window reach it, so a single bad sample cannot size the
+# expedition depth grid
+MAX_DEPTH_WINDOW = 3
+
+CATALOG_COLUMNS = """
+    data_path TEXT PRIMARY KEY,
+    log_path TEXT NOT NULL,
+    title TEXT,
+    subdir TEXT,
+    gas_type TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    n_rows INTEGER,
+    max_depth REAL,
+    file_hash TEXT,
+    file_size INTEGER,
+    file_mtime REAL
+"""
+
+
+class ExpeditionCatalog:
+    """
+    SQLite index of the profiles of an expedition
+
+    One row per .txt/.log pair with its time span and gas type (from the .log),
+    row count and maximum depth (from a single-column read of the .txt, see
+    MAX_DEPTH_WINDOW) and content hash. Once built, selecting profiles does not open any data file.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version != CATALOG_VERSION:
+                conn.execute("DROP TABLE IF EXISTS profiles")
+                conn.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS profiles ({CATALOG_COLUMNS})")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_gas_time ON profiles (gas_type, start_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_depth ON profiles (max_depth)")
+
+    @contextmanager
+    def _connect(self):
+        """Connection committed on success (rolled back on error), then closed"""
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            yield conn
+
+    def build(self, l0_dir: Path) -> int:
+        """
+        Scan an L0 directory recursively and index every profile with a .log file
+
+        Profiles whose size and modification time are unchanged since the last
+        scan are not read again. The catalog mirrors `l0_dir`: rows of profiles
+        not found by the scan (files removed, or indexed under another
+        directory before the expedition was moved or copied) are deleted.
+
+        Returns
+        -------
+        int
+            Number of profiles (re)indexed
+        """
+        l0_dir = Path(l0_dir)
+        with self._connect() as conn:
+            known = {
+                path: (size, mtime) for path, size, mtime in
+                conn.execute("SELECT data_path, file_size, file_mtime FROM profiles")
+            }
+            rows, seen = [], set()
+            for data_path in sorted(l0_dir.rglob("*.txt")):
+                log_path = data_path.with_suffix('.log')
+                if not log_path.exists():
+                    continue
+                seen.add(str(data_path))
+                stat = data_path.stat()
+                if known.get(str(data_path)) == (stat.st_size, stat.st_mtime):
+                    continue
+                rows.append(self._describe(data_path, log_path, l0_dir))
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO profiles VALUES "
+                "(:data_path, :log_path, :title, :subdir, :gas_type, :start_time, :end_time, "
+                ":n_rows, :max_depth, :file_hash, :file_size, :file_mtime)",
+                rows
+            )
+            stale = [(path,) for path in known if path not in seen]
+            conn.executemany("DELETE FROM profiles WHERE data_path = ?", stale)
+        return len(rows)
+
+    def _describe(self, data_path: Path, log_path: Path, l0_dir: Path) -> dict:
+        """Catalog row for one profile"""
+        with open(log_path, 'r') as f:
+            metadata = SubOceanMetadata.from_dict(json.load(f))
+        depth = pd.read_csv(data_path, sep=L0_SEPARATOR, usecols=['Depth (meter)'],
+                            dtype={'Depth (meter)': 'float64'},
+                            na_values=L0_NA_VALUES)['Depth (meter)']
+        max_depth = depth.rolling(MAX_DEPTH_WINDOW, center=True).median().max()
+        stat = data_path.stat()
+        return {
+            'data_path': str(data_path),
+            'log_path': str(log_path),
+            'title': metadata.title,
+            'subdir': data_path.parent.relative_to(l0_dir).as_posix(),
+            'gas_type': GAS_TYPES[metadata.gas_type],
+            'start_time': metadata.start_time.isoformat(sep=' '),
+            'end_time': metadata.end_time.isoformat(sep=' '),
+            'n_rows': len(depth),
+            'max_depth': None if pd.isna(max_depth) else float(max_depth),
+            'file_hash': hash_file(data_path),
+            'file_size': stat.st_size,
+            'file_mtime': stat.st_mtime,
+        }
+
+    def query(self,
+              gas_type: Optional[str] = None,
+              min_depth: Optional[float] = None,
+              start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Select profiles from the index
+
+        Parameters
+        ----------
+        gas_type : str, optional
+            'CH4' or 'N2O'
+        min_depth : float, optional
+            Keep profiles whose maximum depth is at least this deep (m)
+        start, end : datetime, optional
+            Keep profiles starting in [start, end)
+
+        Example: all N2O casts deeper than 50 m in December 2024
+            catalog.query('N2O', min_depth=50,
+                          start=datetime(2024, 12, 1), end=datetime(2025, 1, 1))
+        """
+        conditions, params = [], []
+        if gas_type is not None:
+            conditions.append("gas_type = ?")
+            params.append(gas_type)
+        if min_depth is not None:
+            conditions.append("max_depth >= ?")
+            params.append(min_depth)
+        if start is not None:
+            conditions.append("start_time >= ?")
+            params.append(pd.Timestamp(start).isoformat(sep=' '))
+        if end is not None:
+            conditions.append("start_time < ?")
+            params.append(pd.Timestamp(end).isoformat(sep=' '))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.sql(f"SELECT * FROM profiles{where} ORDER BY start_time", params)
+
+    def sql(self, query: str, params=()) -> pd.DataFrame:
+        """Run an arbitrary SELECT against the profiles table"""
+        with self._connect() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        for col in ['start_time', 'end_time']:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col])
+        return df
+
+    def deepest(self, gas_type: Optional[str] = None) -> Optional[float]:
+        """Maximum depth over all profiles (of one gas type), None if unknown
+
+        Sizes the expedition-wide depth grid without opening any data file.
+        """
+        where, params = ("WHERE gas_type = ?", (gas_type,)) if gas_type is not None else ("", ())
+        with self._connect() as conn:
+            (depth,) = conn.execute(f"SELECT MAX(max_depth) FROM profiles {where}", params).fetchone()
+        return depth
+
+    def profile_pairs(self, **filters) -> List[Tuple[Path, Path]]:
+        """(data, log) path pairs of the selected profiles, see query() for filters"""
+        df = self.query(**filters)
+        return [(Path(d), Path(l)) for d, l in zip(df['data_path'], df['log_path'])]
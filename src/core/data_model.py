@@ -3,6 +3,9 @@ from datetime import datetime
 from typing import Dict, Optional
 from pathlib import Path
 
+# "Type of gas" in the .log files: false for SubOcean-CH4, true for SubOcean-N2O
+GAS_TYPES = {False: 'CH4', True: 'N2O'}
+
 @dataclass
 class GasParameters:
     min_concentration: float
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def fingerprint(*parts) -> str:
+    """SHA-256 of JSON-serialisable parts (dict keys sorted, other objects as str)"""
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ProcessingManifest:
+    """
+    JSON record of how every profile of an expedition was processed
+
+    Each profile entry holds one key per stage, a fingerprint of the stage's
+    inputs (L0/log hashes, configuration, pipeline version and the key of the
+    stage before it), and the output files written from them. A profile is up
+    to date when its stage keys are unchanged and its outputs still exist, so
+    a re-run only processes new or modified profiles, or all of them once the
+    configuration or pipeline version changes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.profiles: Dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.profiles = json.load(f)
+
+    def is_current(self, profile: str, stages: Dict[str, str]) -> bool:
+        """True if `profile` was processed with the same stage keys and its outputs exist"""
+        entry = self.profiles.get(profile)
+        if entry is None or entry['stages'] != stages:
+            return False
+        return all(Path(path).exists() for path in entry['outputs'])
+
+    def get(self, profile: str) -> Optional[dict]:
+        return self.profiles.get(profile)
+
+    def record(self, profile: str, stages: Dict[str, str], outputs: List[Path], **info) -> None:
+        """Store the stage keys and outputs of a processed profile; `info` is kept as is"""
+        self.profiles[profile] = {'stages': stages,
+                                  'outputs': [str(path) for path in outputs], **info}
+
+    def drop(self, profile: str) -> None:
+        self.profiles.pop(profile, None)
+
+    def save(self) -> Path:
+        """Write the manifest (to a temporary file first, then renamed)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.profiles, f, indent=1, sort_keys=True)
+        tmp_path.replace(self.path)
+        return self.path
@@ -1,9 +1,20 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, Iterator, Iterable, List
 from .data_model import SubOceanMetadata
+from .cache import ParsedFrameCache
+from .schema import (L0_SEPARATOR, L0_NA_VALUES, read_header, dtypes_for,
+                     cast_to_schema, parse_datetime, project_columns)
 import json
+import io
+
+try:
+    import pyarrow  # noqa: F401
+    # pyarrow.csv parses L0 files faster than pandas' C engine (scripts/benchmark_load.py)
+    DEFAULT_ENGINE = 'pyarrow'
+except ImportError:
+    DEFAULT_ENGINE = 'c'
 
 class Profile:
     """Handles SubOcean profile data and metadata"""
@@ -13,19 +24,140 @@ class Profile:
         self.data: Optional[pd.DataFrame] = None
         self.metadata: Optional[SubOceanMetadata] = None
         
-    def load(self) -> Tuple[pd.DataFrame, Optional[SubOceanMetadata]]:
-        """Load profile data and metadata"""
-        self.data = pd.read_csv(self.data_path, sep='\t')
+    def load(self, engine: Optional[str] = None,
+             cache: Optional[ParsedFrameCache] = None,
+             usecols: Optional[Iterable[str]] = None) -> Tuple[pd.DataFrame, Optional[SubOceanMetadata]]:
+        """
+        Load profile data and metadata
+        
+        Known L0 columns are read with the dtypes declared in core.schema,
+        so pandas skips type inference for them.
         
-        # Create datetime column while preserving originals
-        self.data['datetime'] = pd.to_datetime(
-            self.data['Date'] + ' ' + self.data['Time']
-        )
+        Parameters
+        ----------
+        engine : str, optional
+            'pyarrow' or pandas' 'c' engine. Defaults to pyarrow when it is
+            installed: with the C engine the schema path is not faster than
+            the former inferring loader, and can be slower
+        cache : ParsedFrameCache, optional
+            If given, an unchanged file is memory-mapped from the cache instead
+            of being parsed again, and a newly parsed file is added to it
+        usecols : iterable of str, optional
+            Only load these columns (plus Date and Time, needed for datetime).
+            Columns absent from the file are ignored. With a cache the full
+            frame is cached and projected afterwards, which costs nothing on a hit.
+        """
+        columns = project_columns(read_header(self.data_path), usecols)
+        key = cache.key(self.data_path) if cache is not None else None
+        self.data = cache.get(key) if cache is not None else None
         
+        if self.data is None:
+            self.data = self._read_table(engine or DEFAULT_ENGINE,
+                                         None if cache is not None else columns)
+            
+            # Create datetime column while preserving originals
+            self.data['datetime'] = parse_datetime(self.data)
+            if cache is not None:
+                cache.put(key, self.data)
+        if usecols is not None and cache is not None:
+            self.data = self.data[columns + ['datetime']]
+        
+        self.load_metadata()
+        return self.data, self.metadata
+
+    def load_metadata(self) -> Optional[SubOceanMetadata]:
+        """Load metadata from the .log file, if there is one"""
         if self.log_path and self.log_path.exists():
             with open(self.log_path, 'r') as f:
                 metadata_dict = json.load(f)
                 self.metadata = SubOceanMetadata.from_dict(metadata_dict)
+        return self.metadata
+
+    def iter_chunks(self, rows: int = 100_000,
+                    usecols: Optional[Iterable[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream the profile data in typed chunks of at most `rows` rows
         
-        return self.data, self.metadata
-    
+        Each chunk has the same dtypes and datetime column as the frame returned
+        by load(), and keeps its row positions in the file as index. Metadata is
+        loaded up front into self.metadata; self.data is left untouched.
+        
+        Parameters
+        ----------
+        rows : int
+            Maximum number of rows per chunk
+        usecols : iterable of str, optional
+            Only load these columns, as in load()
+        """
+        self.load_metadata()
+        columns = project_columns(read_header(self.data_path), usecols)
+        reader = pd.read_csv(self.data_path, sep=L0_SEPARATOR, chunksize=rows,
+                             usecols=columns, dtype=dtypes_for(columns),
+                             na_values=L0_NA_VALUES)
+        with reader:
+            for chunk in reader:
+                chunk['datetime'] = parse_datetime(chunk)
+                yield chunk
+
+    def _read_table(self, engine: str = 'c',
+                    columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the L0 table (or only `columns` of it) with the declared schema"""
+        columns = columns if columns is not None else read_header(self.data_path)
+        if engine == 'pyarrow':
+            # Go through pyarrow.csv directly: pandas' pyarrow engine applies dtype=
+            # column by column after the read, which costs more than the parse itself
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+            arrow_types = {'str': pa.string(), 'float64': pa.float64()}
+            convert_options = pa_csv.ConvertOptions(
+                column_types={col: arrow_types[dtype]
+                              for col, dtype in dtypes_for(columns).items()},
+                null_values=pa_csv.ConvertOptions().null_values + L0_NA_VALUES,
+                strings_can_be_null=False,
+                include_columns=columns,
+            )
+            table = pa_csv.read_csv(self.data_path,
+                                    parse_options=pa_csv.ParseOptions(delimiter=L0_SEPARATOR),
+                                    convert_options=convert_options)
+            return cast_to_schema(table.to_pandas())
+        return pd.read_csv(self.data_path, sep=L0_SEPARATOR, engine=engine,
+                           usecols=columns, dtype=dtypes_for(columns),
+                           na_values=L0_NA_VALUES)
+
+
+class ProfileTail:
+    """Incrementally read rows appended to an L0 file that is still being logged"""
+    def __init__(self, data_path: Path):
+        self.data_path = Path(data_path)
+        self.offset = 0
+        self.rows_read = 0
+        self.columns: Optional[list] = None
+
+    def read_new(self) -> pd.DataFrame:
+        """
+        Parse the complete lines appended since the previous call
+        
+        Only the bytes after the remembered offset are read, so the cost of a
+        call depends on what was appended, not on the size of the file. A line
+        still being written (no trailing newline yet) is left for the next call.
+        """
+        with open(self.data_path, 'rb') as f:
+            f.seek(self.offset)
+            block = f.read()
+        end = block.rfind(b'\n') + 1
+        block = block[:end]
+        self.offset += end
+        
+        if self.columns is None and block:
+            header, _, block = block.partition(b'\n')
+            self.columns = header.decode().rstrip('\r').split(L0_SEPARATOR)
+        if not block:
+            return pd.DataFrame(columns=(self.columns or []) + ['datetime'])
+        
+        df = pd.read_csv(io.BytesIO(block), sep=L0_SEPARATOR, header=None,
+                         names=self.columns, dtype=dtypes_for(self.columns),
+                         na_values=L0_NA_VALUES)
+        df.index = pd.RangeIndex(self.rows_read, self.rows_read + len(df))
+        self.rows_read += len(df)
+        df['datetime'] = parse_datetime(df)
+        return df
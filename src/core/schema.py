@@ -0,0 +1,107 @@
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Bump whenever the column list, dtypes or datetime parsing below change,
+# so that anything keyed on the parsed frame can be invalidated.
+L0_SCHEMA_VERSION = 1
+
+L0_DATETIME_FORMAT = '%Y/%m/%d %H:%M:%S'
+L0_SEPARATOR = '\t'
+# Upper-case NAN shows up in the flow and cavity columns of some files
+L0_NA_VALUES = ['NAN']
+
+L0_STRING_COLUMNS = [
+    'Date',
+    'Time',
+    'Date calibrated',
+    'Time calibrated',
+]
+
+L0_FLOAT_COLUMNS = [
+    # Dissolved gas concentrations
+    '[CH4] dissolved with water vapour (ppm)',
+    '[CH4] dissolved with water vapour (nmol/L)',
+    '[CH4] dissolved with constant dry gas flow (ppm)',
+    '[CH4] dissolved with constant dry gas flow (nmol/L)',
+    '[N2O] dissolved with water vapour (ppm)',
+    '[N2O] dissolved with water vapour (nmol/L)',
+    '[N2O] dissolved with constant dry gas flow (ppm)',
+    '[N2O] dissolved with constant dry gas flow (nmol/L)',
+    '[NH3] dissolved (ppm)',
+    '[C2H6] dissolved (ppm)',
+    'Delta 13 CH4 (per-mille)',
+    # Position
+    'Depth (meter)',
+    'Hydrostatic Pressure Calibrated (bar)',
+    'Carrier gas pressure calibrated (bar)',
+    # Measured gas
+    '[CH4] measured (ppm)',
+    '[N2O] measured (ppm)',
+    '[NH3] measured (ppm)',
+    '[H2O] measured (%)',
+    '[C13] measured (ppm)',
+    '[C2H6] measured (ppm)',
+    # Flows and cell
+    'Flow Carrier Gas (sccm)',
+    'Total Flow (sccm)',
+    'Cavity Pressure (mbar)',
+    'Cellule Temperature (Degree Celsius)',
+    'Hydrostatic pressure (bar)',
+    # Spectrometer diagnostics
+    'LShift',
+    'Error Standard',
+    'Ringdown Time (microSec)',
+    'Box Temperature (Degree Celsius)',
+    'Box Pressure (mbar)',
+    'Carrier gas pressure (dbar)',
+    'PWM Cellule Temperature',
+    'PWM Cellule Pressure',
+    'Laser Temperature (Degree Celsius)',
+    'Laser Flux',
+    'Norm Signal',
+    'Value Max',
+]
+
+L0_SCHEMA: Dict[str, str] = {
+    **{col: 'str' for col in L0_STRING_COLUMNS},
+    **{col: 'float64' for col in L0_FLOAT_COLUMNS},
+}
+
+
+def read_header(data_path: Path) -> List[str]:
+    """Read the column names of an L0 file without parsing any data"""
+    with open(data_path, 'r') as f:
+        return f.readline().rstrip('\r\n').split(L0_SEPARATOR)
+
+
+def dtypes_for(columns: Iterable[str]) -> Dict[str, str]:
+    """Declared dtypes for the known columns; unknown columns are left to inference"""
+    return {col: L0_SCHEMA[col] for col in columns if col in L0_SCHEMA}
+
+
+def project_columns(header: List[str], usecols: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Columns of `header` to load for the requested `usecols`, in file order
+    
+    Date and Time are always kept since datetime is built from them; requested
+    columns that the file does not have are ignored.
+    """
+    if usecols is None:
+        return list(header)
+    wanted = set(usecols) | {'Date', 'Time'}
+    return [col for col in header if col in wanted]
+
+
+def parse_datetime(df: pd.DataFrame) -> pd.Series:
+    """Build the datetime column from Date and Time with the fixed L0 format"""
+    return pd.to_datetime(df['Date'] + ' ' + df['Time'], format=L0_DATETIME_FORMAT)
+
+
+def cast_to_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast known columns that were inferred with another dtype to the declared one"""
+    # pyarrow turns Time into datetime.time objects and all-integer columns into int64
+    mismatched = {col: dtype for col, dtype in dtypes_for(df.columns).items()
+                  if not pd.api.types.is_dtype_equal(df[col].dtype, dtype)
+                  and not (dtype == 'str' and pd.api.types.is_string_dtype(df[col]))}
+    return df.astype(mismatched) if mismatched else df
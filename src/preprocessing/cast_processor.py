@@ -1,40 +1,179 @@
+import numpy as np
 import pandas as pd
+from typing import Tuple
+
+
+def smooth(values: np.ndarray, window: int) -> np.ndarray:
+    """Centered moving average from a cumulative sum, NaNs interpolated first"""
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return values
+    index = np.arange(len(values))
+    values = np.interp(index, index[valid], values[valid])
+    if window <= 1:
+        return values
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    lo = np.clip(index - window // 2, 0, len(values))
+    hi = np.clip(index + window - window // 2, 0, len(values))
+    return (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def turning_points(pressure: np.ndarray, hysteresis: float) -> np.ndarray:
+    """
+    Indices of the pressure extrema separating the casts
+
+    Candidates are the local extrema of `pressure` (sign changes of its
+    gradient, found vectorized). A candidate only becomes a turning point when
+    the pressure moved by at least `hysteresis` since the previous turning
+    point, so wiggles and pauses do not split a cast. The first and last
+    samples are always included; a last stretch shorter than `hysteresis`
+    belongs to the last leg.
+    """
+    n = len(pressure)
+    if n < 2:
+        return np.array([0, max(n - 1, 0)])
+    step = np.sign(np.diff(pressure))
+    # Carry the last non-zero direction over flat stretches
+    nonzero = np.where(step != 0, np.arange(len(step)), 0)
+    step = step[np.maximum.accumulate(nonzero)]
+    candidates = np.flatnonzero(step[1:] != step[:-1]) + 1
+
+    # Hysteresis over the candidates only (far fewer than the samples)
+    turns = [0]
+    direction = 0
+    for i in candidates:
+        change = pressure[i] - pressure[turns[-1]]
+        if direction and np.sign(change) == direction:
+            # The current leg goes further: move its end
+            turns[-1] = i
+        elif abs(change) >= hysteresis:
+            direction = np.sign(change)
+            turns.append(i)
+    change = pressure[n - 1] - pressure[turns[-1]]
+    if len(turns) > 1 and (np.sign(change) == direction or abs(change) < hysteresis):
+        turns[-1] = n - 1
+    elif turns[-1] != n - 1:
+        turns.append(n - 1)
+    return np.array(turns)
+
+
+def segment_casts(pressure, window: int = 15, hysteresis: float = 0.1,
+                  min_fraction: float = 0.25) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split a record holding any number of down/up casts (yo-yo) into casts
+
+    Parameters
+    ----------
+    pressure : array-like
+        Hydrostatic pressure in acquisition order
+    window : int
+        Samples of the moving average applied before looking for turning points
+    hysteresis : float
+        Minimum pressure change (same unit as `pressure`) between two turning
+        points; 0.1 bar is about 1 m
+    min_fraction : float
+        Minimum pressure change between two turning points as a fraction of
+        the pressure range of the record, so that a winch stopping and backing
+        up a few meters mid-cast does not start a new cast. Set to 0 for long
+        mooring records whose casts differ a lot in depth.
+
+    Returns
+    -------
+    cast : np.ndarray of int
+        Cast index of every sample. A new cast starts with every descent; a
+        record starting with an ascent has that upcast as cast 0.
+    is_downcast : np.ndarray of bool
+        Direction of every sample
+
+    The cost is linear in the number of samples.
+    """
+    smoothed = smooth(pressure, window)
+    n = len(smoothed)
+    if n == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
+    span = np.ptp(smoothed) if not np.isnan(smoothed).all() else 0.0
+    turns = turning_points(smoothed, max(hysteresis, min_fraction * span))
+
+    # Leg of every sample: turning point i closes leg i - 1 and opens leg i
+    leg_down = np.diff(smoothed[turns]) > 0
+    if len(leg_down) == 0:
+        leg_down = np.array([True])
+    leg = np.clip(np.searchsorted(turns, np.arange(n), side='right') - 1, 0, len(leg_down) - 1)
+
+    starts_cast = leg_down.copy()
+    if not leg_down[0]:
+        starts_cast[0] = True
+    cast_of_leg = np.cumsum(starts_cast) - 1
+    return cast_of_leg[leg], leg_down[leg]
+
 
 class CastProcessor:
     """Handle cast direction detection and separation"""
-    
+
     def __init__(self, pressure_column: str = 'Hydrostatic pressure (bar)'):
         self.pressure_column = pressure_column
 
-    def add_cast_direction(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add basic cast direction based on pressure gradient"""
-        df = df.copy()
+    def add_cast_direction(self, df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+        """Add basic cast direction based on pressure gradient
+
+        With copy=False the result shares the columns of `df` instead of
+        copying them (the new column is not added to `df` itself).
+        """
+        df = df.copy(deep=copy)
         pressure_grad = df[self.pressure_column].diff()
         df['is_downcast'] = pressure_grad > 0
         return df
-        
+
+    def segment_casts(self, df: pd.DataFrame, window: int = 15, hysteresis: float = 0.1,
+                      min_fraction: float = 0.25, pressure_threshold: float = None,
+                      copy: bool = True) -> pd.DataFrame:
+        """
+        Label every sample with its cast index ('cast') and direction ('is_downcast')
+
+        Unlike clean_cast_direction, which splits at the single pressure
+        maximum, any number of yo-yo casts is found (see segment_casts).
+        With `pressure_threshold`, samples whose raw pressure moves against
+        their cast direction by more than the threshold are dropped, as in
+        clean_cast_direction. copy=False shares the columns of `df` as in
+        add_cast_direction.
+        """
+        df = df.copy(deep=copy)
+        pressure = df[self.pressure_column].to_numpy(dtype=float, na_value=np.nan)
+        df['cast'], df['is_downcast'] = segment_casts(pressure, window, hysteresis, min_fraction)
+        if pressure_threshold is None:
+            return df
+
+        gradient = np.diff(pressure, prepend=np.nan)
+        # The first sample of each leg has no gradient within the leg
+        leg_start = np.r_[True, (np.diff(df['cast'].to_numpy()) != 0)
+                          | (np.diff(df['is_downcast'].to_numpy()) != 0)]
+        gradient[leg_start] = np.nan
+        against = np.where(df['is_downcast'], gradient < -pressure_threshold, gradient > pressure_threshold)
+        return df[~against] if against.any() else df
+
     def clean_cast_direction(self, pressure_threshold) -> pd.DataFrame:
         """Clean and separate casts based on maximum pressure"""
         # Find maximum pressure point
         max_pressure_idx = self.df[self.pressure_column].idxmax()
-        
+
         # Split into theoretical down and up casts
         downcast = self.df.iloc[:max_pressure_idx + 1].copy()
         upcast = self.df.iloc[max_pressure_idx:].copy()
-        
+
         # Clean pressure transitions
         def clean_pressure_gradient(df: pd.DataFrame, ascending: bool) -> pd.DataFrame:
                 pressure_grad = df[self.pressure_column].diff()
                 if ascending:
                     return df[pressure_grad >= -pressure_threshold]
                 return df[pressure_grad <= pressure_threshold]
-        
+
         # Clean each cast
         downcast_clean = clean_pressure_gradient(downcast, ascending=True)
         upcast_clean = clean_pressure_gradient(upcast, ascending=False)
-        
+
         # Add cast direction
         downcast_clean['is_downcast'] = True
         upcast_clean['is_downcast'] = False
-        
+
         return pd.concat([downcast_clean, upcast_clean])
\ No newline at end of file
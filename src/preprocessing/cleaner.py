@@ -3,23 +3,60 @@ import numpy as np
 from typing import Optional, Dict, List, Tuple
 from pathlib import Path
 import json
+from .qc_flags import QCFlags, QC_FLAG_COLUMN, QC_FLAG_DTYPE
+from .validation import CompiledValidator
 
 class DataCleaner:
-    def __init__(self, df, validation_ranges=None):
+    def __init__(self, df, validation_ranges=None, packed_flags: bool = False,
+                 qc_flags: Optional[QCFlags] = None):
+        """
+        Args:
+            df: Profile data
+            validation_ranges: Default ranges for validate_measurements
+            packed_flags: Write all flags as bits of a single uint64 QC_FLAGS
+                column (layout in self.qc_flags) instead of one int `*_FLAG`
+                column per validated variable
+            qc_flags: Bit layout of the QC word, shared by every profile
+                (QCFlags.from_rules); by default bits are registered in the
+                order the rules are first applied
+        """
         self.df = df
         self.DEFAULT_VALIDATION_RANGES = validation_ranges
         self.cleaning_log = []
+        self.packed_flags = packed_flags
+        self.qc_flags = qc_flags if qc_flags is not None else QCFlags()
 
-    def ensure_numeric_columns(self, columns):
+    @staticmethod
+    def required_columns(validation_config: Dict) -> List[str]:
+        """L0 columns read by calculate_rsd and validate_data for this configuration"""
+        return (list(validation_config['standard_ranges'])
+                + list(validation_config['gas_rules'])
+                + ['Error Standard'])
+
+    def ensure_numeric_columns(self, columns, df: Optional[pd.DataFrame] = None):
         """Convert columns to numeric type and handle errors"""
+        df = self.df if df is None else df
         for col in columns:
-            if col in self.df.columns:
+            if col in df.columns:
                 try:
-                    self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
+                    df[col] = pd.to_numeric(df[col], errors='coerce')
                     self.cleaning_log.append(f"Converted {col} to numeric")
                 except Exception as e:
                     self.cleaning_log.append(f"Error converting {col}: {str(e)}")
-        return self.df
+        return df
+
+    def _set_flag(self, df: pd.DataFrame, column: str, invalid: pd.Series) -> None:
+        """Record the flag of `column` (True = invalid) as a bit or as a `*_FLAG` column"""
+        if self.packed_flags:
+            word = df[QC_FLAG_COLUMN] if QC_FLAG_COLUMN in df.columns else QCFlags.empty_word(len(df))
+            df[QC_FLAG_COLUMN] = self.qc_flags.set(word, column, invalid.to_numpy())
+        else:
+            df[f"{column}_FLAG"] = invalid.astype(int)
+
+    def unpack_flags(self, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Per-variable `*_FLAG` columns decoded from the packed QC word"""
+        df = self.df if df is None else df
+        return self.qc_flags.unpack(df[QC_FLAG_COLUMN], index=df.index)
 
     def apply_validation_rules(self, validation_rules):
         """
@@ -37,7 +74,7 @@ class DataCleaner:
                 valid_rsd = abs(self.df[f"{gas}_RSD"]) <= rules['rsd_threshold']
                 
                 # Combine masks and create flag column (1 = invalid, 0 = valid)
-                self.df[f"{gas}_FLAG"] = (~(valid_range & valid_rsd)).astype(int)
+                self._set_flag(self.df, gas, ~(valid_range & valid_rsd))
         
         return self.df
 
@@ -52,51 +89,79 @@ class DataCleaner:
         for column, (min_val, max_val) in conditions.items():
             if column in self.df.columns:
                 mask = (self.df[column] >= min_val) & (self.df[column] <= max_val)
-                self.df[f"{column}_FLAG"] = (~mask | self.df[column].isna()).astype(int)
+                self._set_flag(self.df, column, ~mask | self.df[column].isna())
                 self.cleaning_log.append(
                     f"Flagged {column} outside [{min_val}, {max_val}]"
                 )
         return self.df
 
-    def calculate_rsd(self, gas_columns):
+    def apply_sensor_tests(self, tests, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Run QARTOD-style sensor tests (a qartod.SensorTests) into the same flags as validate_data"""
+        df = self.df if df is None else df
+        return tests.apply(df, self.qc_flags if self.packed_flags else None)
+
+    def calculate_rsd(self, gas_columns, df: Optional[pd.DataFrame] = None):
         """Calculate RSD and flag gas measurements while preserving existing flags"""
+        df = self.df if df is None else df
         for column in gas_columns:
-            if column in self.df.columns:
+            if column in df.columns:
                 # Calculate RSD
-                rsd = (self.df['Error Standard']**2) / self.df[column]
-                self.df[f"{column}_RSD"] = rsd
+                rsd = (df['Error Standard']**2) / df[column]
+                df[f"{column}_RSD"] = rsd
                 self.cleaning_log.append(f"Updated RSD for {column}")
-        return self.df
+        return df
+
+    def _flag_mask(self, df: pd.DataFrame) -> Tuple[List[str], np.ndarray]:
+        """Flagged base columns of df and one combined (rows x columns) boolean mask"""
+        if QC_FLAG_COLUMN in df.columns:
+            base_columns = [col for col in self.qc_flags.flagged_variables if col in df.columns]
+            word = df[QC_FLAG_COLUMN].to_numpy(dtype=QC_FLAG_DTYPE)
+            masks = np.array([self.qc_flags.mask([col]) for col in base_columns], dtype=QC_FLAG_DTYPE)
+            return base_columns, (word[:, None] & masks) != 0
+        
+        flag_columns = [col for col in df.columns
+                        if col.endswith('_FLAG') and col.replace('_FLAG', '') in df.columns]
+        base_columns = [col.replace('_FLAG', '') for col in flag_columns]
+        return base_columns, df[flag_columns].to_numpy() == 1
 
-    def filter_flagged_row(self):
-        """Create filtered DataFrame by setting flagged values to NaN"""
-        df_filtered = self.df.copy()
+    def filter_flagged_row(self, inplace: bool = False):
+        """Create filtered DataFrame by setting flagged values to NaN
         
-        # Get all flag columns
-        flag_columns = [col for col in self.df.columns if col.endswith('_FLAG')]
+        Args:
+            inplace: Write the NaNs into self.df instead of a copy of it. Only
+                the flagged columns are rewritten, in one masked assignment.
+        """
+        df_filtered = self.df if inplace else self.df.copy()
         
-        # Apply flags
-        for flag_col in flag_columns:
-            base_col = flag_col.replace('_FLAG', '')
-            if base_col in df_filtered.columns:
-                df_filtered.loc[df_filtered[flag_col] == 1, base_col] = np.nan
+        base_columns, mask = self._flag_mask(df_filtered)
+        if base_columns:
+            df_filtered[base_columns] = df_filtered[base_columns].mask(mask)
         self.df = df_filtered
         return self.df 
 
-    def filter_flagged_rows(self, columns_to_check):
+    def filter_flagged_rows(self, columns_to_check, inplace: bool = False):
         """Create filtered DataFrame by setting rows to NaN based on specified column flags
         
         Args:
             columns_to_check: List of base column names to check flags
+            inplace: Write the NaNs into self.df instead of a copy of it
             
         Returns:
             DataFrame with NaN values where specified flags are raised
         """
-        df_filtered = self.df.copy()
+        df_filtered = self.df if inplace else self.df.copy()
+        
+        if QC_FLAG_COLUMN in df_filtered.columns:
+            mask = self.qc_flags.any(df_filtered[QC_FLAG_COLUMN], columns_to_check)
+            # Keep the QC word itself so the flags survive into L1B/L2
+            data_columns = df_filtered.columns.drop(QC_FLAG_COLUMN)
+            df_filtered.loc[mask, data_columns] = np.nan
+            self.df = df_filtered
+            return self.df
         
         # Get relevant flag columns
         flag_columns = [f"{col}_FLAG" for col in columns_to_check 
-                    if f"{col}_FLAG" in self.df.columns]
+                    if f"{col}_FLAG" in df_filtered.columns]
         
         # Create mask where any specified flag is 1
         mask = df_filtered[flag_columns].eq(1).any(axis=1)
@@ -113,7 +178,8 @@ class DataCleaner:
         self.calculate_rsd(gas_columns)
         print("\n".join(self.cleaning_log))
 
-    def validate_data(self, validation_config: Dict) -> pd.DataFrame:
+    def validate_data(self, validation_config,
+                      df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
         """
         Unified validation system for all measurements
         
@@ -129,24 +195,33 @@ class DataCleaner:
                     }
                 }
             }
+            
+            or the same configuration compiled once into a CompiledValidator,
+            which evaluates all rules in a single vectorized pass
+            df: Frame to validate in place instead of self.df, e.g. a chunk
+                from Profile.iter_chunks. Validation is row-wise, so chunks
+                can be validated independently.
         """
         """Flag measurements outside validation ranges"""
+        df = self.df if df is None else df
+        if isinstance(validation_config, CompiledValidator):
+            return validation_config.apply(df, self.qc_flags if self.packed_flags else None)
         conditions = validation_config['standard_ranges'] or self.DEFAULT_VALIDATION_RANGES
         
         # Convert all columns to numeric first
         numeric_columns = list(conditions.keys())
-        self.ensure_numeric_columns(numeric_columns)
+        self.ensure_numeric_columns(numeric_columns, df)
         # First validate standard measurements
         for column, (min_val, max_val) in validation_config['standard_ranges'].items():
-            if column in self.df.columns:
-                mask = (self.df[column] >= min_val) & (self.df[column] <= max_val)
-                self.df[f"{column}_FLAG"] = (~mask | self.df[column].isna()).astype(int)
+            if column in df.columns:
+                mask = (df[column] >= min_val) & (df[column] <= max_val)
+                self._set_flag(df, column, ~mask | df[column].isna())
                 
         # Then handle gas measurements with RSD
         for gas, rules in validation_config['gas_rules'].items():
-            if gas in self.df.columns:
-                valid_range = (self.df[gas] >= rules['range'][0]) & (self.df[gas] <= rules['range'][1])
-                valid_rsd = abs(self.df[f"{gas}_RSD"]) <= rules['rsd_threshold']
-                self.df[f"{gas}_FLAG"] = (~(valid_range & valid_rsd)).astype(int)
+            if gas in df.columns:
+                valid_range = (df[gas] >= rules['range'][0]) & (df[gas] <= rules['range'][1])
+                valid_rsd = abs(df[f"{gas}_RSD"]) <= rules['rsd_threshold']
+                self._set_flag(df, gas, ~(valid_range & valid_rsd))
                 
-        return self.df
\ No newline at end of file
+        return df
\ No newline at end of file
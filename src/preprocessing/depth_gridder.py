@@ -2,7 +2,145 @@ import xarray as xr
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, NamedTuple
+
+
+class DepthBins(NamedTuple):
+    """Per-bin statistics of several columns on a regular depth grid"""
+    grid: np.ndarray      # bin centers, shape (n_bins,)
+    sum: np.ndarray       # shape (n_bins, n_columns)
+    count: np.ndarray     # non-NaN samples, shape (n_bins, n_columns)
+    mean: np.ndarray      # NaN for empty bins
+    std: np.ndarray       # sample standard deviation, NaN for fewer than 2 samples
+    median: Optional[np.ndarray] = None
+
+
+class DepthGrid(NamedTuple):
+    """Regular depth grid shared by every profile of an expedition
+
+    Point i is depth_min + i * depth_interval. Profiles binned on the same
+    grid only differ in which points hold data, so they stack by index.
+    """
+    depth_min: float
+    depth_interval: float
+    n_bins: int
+
+    @classmethod
+    def from_range(cls, depth_min: float, depth_max: float, depth_interval: float = 0.05) -> 'DepthGrid':
+        """Grid from floor(depth_min) to ceil(depth_max), both included"""
+        depth_min = float(np.floor(depth_min))
+        n_bins = int(round((np.ceil(depth_max) - depth_min) / depth_interval)) + 1
+        return cls(depth_min, depth_interval, n_bins)
+
+    @property
+    def points(self) -> np.ndarray:
+        return self.depth_min + np.arange(self.n_bins) * self.depth_interval
+
+    def offset(self, depth: float) -> int:
+        """Index of the grid point nearest to `depth`"""
+        return int(np.floor((depth - self.depth_min) / self.depth_interval + 0.5))
+
+    def span(self, depth_min: float, depth_max: float) -> 'DepthGrid':
+        """Shortest stretch of this grid (at least one point) holding the bins of depth_min..depth_max"""
+        first = min(max(self.offset(depth_min), 0), self.n_bins - 1)
+        last = min(max(self.offset(depth_max), first), self.n_bins - 1)
+        return DepthGrid(self.depth_min + first * self.depth_interval, self.depth_interval, last - first + 1)
+
+
+def _bincount_2d(bins: np.ndarray, values: np.ndarray, n_bins: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sums and counts of the non-NaN values of every column in every bin
+
+    One bincount over (bin, column) pairs instead of a loop over columns.
+    """
+    n_cols = values.shape[1]
+    flat = (bins[:, None] * n_cols + np.arange(n_cols)).ravel()
+    valid = ~np.isnan(values).ravel()
+    sums = np.bincount(flat[valid], weights=values.ravel()[valid],
+                       minlength=n_bins * n_cols).reshape(n_bins, n_cols)
+    counts = np.bincount(flat[valid], minlength=n_bins * n_cols).reshape(n_bins, n_cols)
+    return sums, counts
+
+
+def _binned_median(bins: np.ndarray, values: np.ndarray, n_bins: int, counts: np.ndarray) -> np.ndarray:
+    """Median of every column in every bin from one sort by (bin, value) per column"""
+    n_cols = values.shape[1]
+    # Samples of bin b occupy [start[b], start[b + 1]) once sorted by bin
+    start = np.concatenate([[0], np.cumsum(np.bincount(bins, minlength=n_bins))[:-1]])
+    lower = start[:, None] + (counts - 1) // 2
+    upper = start[:, None] + counts // 2
+    medians = np.full((n_bins, n_cols), np.nan)
+    filled = counts > 0
+    for k in range(n_cols):
+        # NaNs sort after the values of their bin, so they are never picked
+        order = np.lexsort((values[:, k], bins))
+        ordered = values[order, k]
+        rows = filled[:, k]
+        medians[rows, k] = (ordered[lower[rows, k]] + ordered[upper[rows, k]]) / 2
+    return medians
+
+
+def bin_by_depth(depth: np.ndarray, values: np.ndarray, depth_interval: float,
+                 depth_min: float, n_bins: int, median: bool = False) -> DepthBins:
+    """
+    Per-bin count, sum, mean and standard deviation of all columns of
+    `values` on a regular depth grid, and optionally the median
+
+    Grid point i is depth_min + i * depth_interval and collects the samples
+    within half an interval of it. Bin indices are computed once with floor
+    and all columns are aggregated together; samples with a NaN depth or
+    outside the grid are ignored, NaN values are skipped. The standard
+    deviation is taken around the bin means (a second bincount of the
+    squared deviations, no groupby).
+
+    Parameters
+    ----------
+    depth : np.ndarray
+        Depth of every sample, shape (n,)
+    values : np.ndarray
+        Samples to average, shape (n, n_columns)
+    depth_interval : float
+        Grid spacing
+    depth_min : float
+        First grid point
+    n_bins : int
+        Number of grid points
+    median : bool
+        Also compute the median (one sort per column)
+    """
+    with np.errstate(invalid='ignore'):
+        bins = np.floor((depth - depth_min) / depth_interval + 0.5)
+        inside = (bins >= 0) & (bins < n_bins)
+    bins, values = bins[inside].astype(np.int64), values[inside]
+    sums, counts = _bincount_2d(bins, values, n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        squares, _ = _bincount_2d(bins, (values - means[bins]) ** 2, n_bins)
+        std = np.sqrt(squares / (counts - 1))
+    std[counts < 2] = np.nan
+    grid = depth_min + np.arange(n_bins) * depth_interval
+    medians = _binned_median(bins, values, n_bins, counts) if median else None
+    return DepthBins(grid, sums, counts, means, std, medians)
+
+
+def fill_empty_bins(means: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate empty bins between the nearest filled bins above and
+    below, for all columns at once; bins outside the filled range stay NaN
+    """
+    filled = counts > 0
+    index = np.arange(len(means))[:, None]
+    # Nearest filled bin at or above / at or below every bin, per column
+    previous = np.maximum.accumulate(np.where(filled, index, -1), axis=0)
+    following = np.minimum.accumulate(np.where(filled, index, len(means))[::-1], axis=0)[::-1]
+    gaps = ~filled & (previous >= 0) & (following < len(means))
+    if not gaps.any():
+        return means
+    rows, cols = np.nonzero(gaps)
+    lo, hi = previous[rows, cols], following[rows, cols]
+    weight = (rows - lo) / (hi - lo)
+    result = means.copy()
+    result[rows, cols] = means[lo, cols] * (1 - weight) + means[hi, cols] * weight
+    return result
 
 
 class DepthGridder_xr:
@@ -40,4 +178,252 @@ class DepthGridder_xr:
         ds_interp.attrs['profile_name'] = self.profile_name
         ds_interp.attrs['depth_interval'] = depth_interval
         
-        return ds_interp
\ No newline at end of file
+        return ds_interp
+
+    def bin_to_grid(self, depth_interval: float = 0.05, fill_empty: bool = True,
+                    median: bool = False, grid: Optional[DepthGrid] = None) -> xr.Dataset:
+        """
+        Average all numeric columns in depth bins centered on a regular grid
+        
+        Same grid as interpolate_to_grid, but every sample is assigned to its
+        bin once and all columns are averaged together (bin_by_depth) instead
+        of grouping on raw depths and interpolating each variable. Next to
+        the mean `<column>`, each column gets `<column>_n_obs` (raw samples in
+        the bin, 0 for filled bins) and `<column>_std`, from the same pass.
+        
+        Parameters
+        ----------
+        depth_interval : float
+            Interval for depth grid in meters (default: 0.05)
+        fill_empty : bool
+            Fill bins without samples by linear interpolation between the
+            neighbouring bin means (within the sampled depth range), so that
+            a cast sampled more coarsely than the grid has no gaps
+        median : bool
+            Also store `<column>_median`
+        grid : DepthGrid, optional
+            Shared (e.g. expedition-wide) grid: the cast is binned on the
+            stretch of it covering its depths (DepthGrid.span), so casts
+            gridded on the same grid stack by index (see stack_profiles).
+            depth_interval is then ignored and samples outside the grid
+            are dropped.
+        """
+        if self.depth_column not in self.df.columns:
+            raise ValueError(f"Depth column '{self.depth_column}' not found")
+        
+        numeric_cols = self.df.select_dtypes(include=[np.number]).columns.drop(self.depth_column)
+        depth = self.df[self.depth_column].to_numpy(dtype=float, na_value=np.nan)
+        values = self.df[numeric_cols].to_numpy(dtype=float, na_value=np.nan)
+        
+        if grid is None:
+            grid = DepthGrid.from_range(np.nanmin(depth), np.nanmax(depth), depth_interval)
+        else:
+            grid = grid.span(np.nanmin(depth), np.nanmax(depth))
+        bins = bin_by_depth(depth, values, grid.depth_interval, grid.depth_min, grid.n_bins, median=median)
+        
+        means = fill_empty_bins(bins.mean, bins.count) if fill_empty else bins.mean
+        
+        statistics = {'': means, '_n_obs': bins.count, '_std': bins.std}
+        if median:
+            statistics['_median'] = bins.median
+        ds = xr.Dataset(
+            {f"{col}{suffix}": (self.depth_column, block[:, k])
+             for k, col in enumerate(numeric_cols) for suffix, block in statistics.items()},
+            coords={self.depth_column: bins.grid}
+        )
+        ds.attrs['profile_name'] = self.profile_name
+        ds.attrs['depth_interval'] = grid.depth_interval
+        return ds
+
+class DepthBinAccumulator:
+    """Running per-bin sums and counts on a regular depth grid, updated chunk by chunk"""
+    
+    def __init__(self, depth_column: str = 'Depth (meter)',
+                 depth_interval: float = 0.05, profile_name: str = None):
+        self.depth_column = depth_column
+        self.depth_interval = depth_interval
+        self.profile_name = profile_name if profile_name else 'profile'
+        self.columns: Optional[list] = None
+        self.first_bin = 0
+        self.sums = np.zeros((0, 0))
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        
+    def update(self, df: pd.DataFrame) -> None:
+        """
+        Add the samples of `df` to the bins
+        
+        Each sample goes to the nearest grid point (multiples of depth_interval).
+        The grid grows when a chunk reaches beyond it; the cost of an update is
+        proportional to the chunk, not to what was accumulated before.
+        """
+        if self.columns is None:
+            numeric_cols = df.select_dtypes(include=[np.number]).columns
+            self.columns = list(numeric_cols.drop(self.depth_column))
+            self.sums = np.zeros((0, len(self.columns)))
+            self.counts = np.zeros((0, len(self.columns)), dtype=np.int64)
+        
+        depth = df[self.depth_column].to_numpy(dtype=float)
+        valid_depth = ~np.isnan(depth)
+        if not valid_depth.any():
+            return
+        bins = np.round(depth[valid_depth] / self.depth_interval).astype(np.int64)
+        values = df.loc[valid_depth, self.columns].to_numpy(dtype=float)
+        
+        self._grow(bins.min(), bins.max())
+        sums, counts = _bincount_2d(bins - self.first_bin, values, len(self.sums))
+        self.sums += sums
+        self.counts += counts
+        
+    def _grow(self, low: int, high: int) -> None:
+        """Extend the bin arrays so that they cover bins low..high"""
+        if len(self.sums) == 0:
+            self.first_bin = low
+        last_bin = self.first_bin + len(self.sums) - 1
+        pad_before = max(self.first_bin - low, 0)
+        pad_after = max(high - last_bin, 0)
+        if pad_before or pad_after:
+            self.sums = np.pad(self.sums, ((pad_before, pad_after), (0, 0)))
+            self.counts = np.pad(self.counts, ((pad_before, pad_after), (0, 0)))
+            self.first_bin -= pad_before
+            
+    def to_dataset(self) -> xr.Dataset:
+        """Mean of every variable per depth bin, with NaN for empty bins"""
+        depth_grid = (self.first_bin + np.arange(len(self.sums))) * self.depth_interval
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts
+        ds = xr.Dataset(
+            {col: (self.depth_column, means[:, i]) for i, col in enumerate(self.columns or [])},
+            coords={self.depth_column: depth_grid}
+        )
+        ds.attrs['profile_name'] = self.profile_name
+        ds.attrs['depth_interval'] = self.depth_interval
+        return ds
+
+
+class L3BBuilder:
+    """
+    (profile x depth) store of gridded casts, filled as they are produced
+
+    Every variable is a (capacity, n_bins) array on a shared DepthGrid;
+    add() copies a cast into the next row by index (a cast on a stretch of
+    the grid lands at grid.offset() of its first depth), so no per-cast
+    file or alignment step is needed. The capacity doubles when full.
+    Variables missing from a cast stay NaN (0 for `_n_obs` counts).
+    """
+    
+    def __init__(self, grid: DepthGrid, depth_column: str = 'Depth__meter_', capacity: int = 16):
+        self.grid = grid
+        self.depth_column = depth_column
+        self.capacity = max(capacity, 1)
+        self.profiles: list = []
+        self.coords: Dict[str, list] = {}
+        self.data: Dict[str, np.ndarray] = {}
+        
+    def _allocate(self, name: str, dtype, rows: int) -> np.ndarray:
+        if name.endswith('_n_obs'):
+            return np.zeros((rows, self.grid.n_bins), dtype=dtype)
+        return np.full((rows, self.grid.n_bins), np.nan)
+        
+    def _reserve(self, rows: int) -> None:
+        """Double the capacity until `rows` rows fit"""
+        capacity = self.capacity
+        while capacity < rows:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        n = len(self.profiles)
+        for name, block in self.data.items():
+            grown = self._allocate(name, block.dtype, capacity)
+            grown[:n] = block[:n]
+            self.data[name] = grown
+        self.capacity = capacity
+        
+    def add(self, profile_id: str, ds: xr.Dataset, **coords) -> None:
+        """
+        Append one gridded cast
+        
+        Parameters
+        ----------
+        profile_id : str
+            Label of the row
+        ds : xr.Dataset
+            Cast gridded on `grid` or on a stretch of it (bin_to_grid)
+        **coords
+            Scalar per-profile coordinates (e.g. cast=0, start_time=...);
+            rows added without them hold None
+        """
+        row = len(self.profiles)
+        self._reserve(row + 1)
+        for name in ds.data_vars:
+            if name not in self.data and ds[name].dims == (self.depth_column,):
+                self.data[name] = self._allocate(name, ds[name].dtype, self.capacity)
+        for name in coords:
+            self.coords.setdefault(name, [None] * row)
+        for name, values in self.coords.items():
+            values.append(coords.get(name))
+        self.profiles.append(profile_id)
+        
+        depth = ds[self.depth_column].values
+        if len(depth) == 0:
+            return
+        start = self.grid.offset(depth[0])
+        lo, hi = max(start, 0), min(start + len(depth), self.grid.n_bins)
+        if lo >= hi:
+            return
+        for name, block in self.data.items():
+            if name in ds:
+                block[row, lo:hi] = ds[name].values[lo - start:hi - start]
+        
+    def extend(self, other: 'L3BBuilder') -> None:
+        """Append all rows of another builder on the same grid (e.g. filled in a worker process)"""
+        if other.grid != self.grid:
+            raise ValueError(f"Cannot merge L3B rows on {other.grid} into {self.grid}")
+        n, m = len(self.profiles), len(other.profiles)
+        self._reserve(n + m)
+        for name, block in other.data.items():
+            if name not in self.data:
+                self.data[name] = self._allocate(name, block.dtype, self.capacity)
+            self.data[name][n:n + m] = block[:m]
+        for name in other.coords:
+            self.coords.setdefault(name, [None] * n)
+        for name, values in self.coords.items():
+            values.extend(other.coords.get(name, [None] * m))
+        self.profiles.extend(other.profiles)
+        
+    def __len__(self) -> int:
+        return len(self.profiles)
+        
+    def to_dataset(self) -> xr.Dataset:
+        """The added casts as (profile, depth) variables on the full grid"""
+        n = len(self.profiles)
+        coords = {'profile': self.profiles, self.depth_column: self.grid.points}
+        coords.update({name: ('profile', values) for name, values in self.coords.items()})
+        ds = xr.Dataset(
+            {name: (('profile', self.depth_column), block[:n]) for name, block in self.data.items()},
+            coords=coords
+        )
+        ds.attrs['depth_interval'] = self.grid.depth_interval
+        return ds
+
+
+def stack_profiles(datasets: Dict[str, xr.Dataset], grid: DepthGrid,
+                   depth_column: str = 'Depth__meter_') -> xr.Dataset:
+    """
+    Stack depth-gridded profiles into one (profile x depth) dataset
+
+    The profiles are copied by index into arrays preallocated for all of
+    them (see L3BBuilder): a profile on `grid`, or on any stretch of it (as
+    per-cast grids of the same interval are), needs no reindexing or
+    outer join. Profile depths outside the grid are dropped.
+
+    Parameters
+    ----------
+    datasets : Dict[str, xr.Dataset]
+        Gridded profiles keyed by profile id, in output order
+    grid : DepthGrid
+        Grid of the stacked dataset
+    """
+    builder = L3BBuilder(grid, depth_column, capacity=len(datasets))
+    for profile_id, ds in datasets.items():
+        builder.add(profile_id, ds)
+    return builder.to_dataset()
@@ -1,11 +1,71 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, NamedTuple, Optional
+from .cast_processor import CastProcessor
+
+
+class DerivedStep(NamedTuple):
+    """Node of the derived parameter graph: method computing `outputs` from `inputs`"""
+    method: str
+    inputs: List[str]
+    outputs: List[str]
+
 
 class DerivedParameters:
-    def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()
+    # L0 columns read by calculate_all and calculate_gas_corrections
+    REQUIRED_COLUMNS = [
+        'Hydrostatic pressure (bar)',
+        '[H2O] measured (%)',
+        'Total Flow (sccm)',
+        'Flow Carrier Gas (sccm)',
+        'Cellule Temperature (Degree Celsius)',
+        '[CH4] dissolved with water vapour (ppm)',
+    ]
+
+    # Derived quantities and the columns they are computed from; an input
+    # produced by another step makes that step an ancestor
+    STEPS = {
+        'flows': DerivedStep(
+            'calculate_flows',
+            ['Total Flow (sccm)', 'Flow Carrier Gas (sccm)', '[H2O] measured (%)'],
+            ['Dry gas Flow [sccm]', 'Water_vapour flow [sccm]']),
+        'ch4_tcell': DerivedStep(
+            'correct_ch4_tcell',
+            ['[CH4] dissolved with water vapour (ppm)', 'Cellule Temperature (Degree Celsius)'],
+            ['[CH4] dissolved with water vapour (ppm) corrected Tcell',
+             '[CH4] dissolved with water vapour (nmol/L) corrected Tcell']),
+        'h2o_tcell': DerivedStep(
+            'correct_h2o_tcell',
+            ['[H2O] measured (%)', 'Cellule Temperature (Degree Celsius)'],
+            ['[H2O] measured corrected Tcell']),
+        'total_flow_tcell': DerivedStep(
+            'correct_total_flow_tcell',
+            ['Dry gas Flow [sccm]', '[H2O] measured corrected Tcell', 'Flow Carrier Gas (sccm)'],
+            ['Total Flow (sccm) corrected Tcell']),
+    }
+    GAS_CORRECTION_OUTPUTS = [
+        '[CH4] dissolved with water vapour (ppm) corrected Tcell',
+        '[CH4] dissolved with water vapour (nmol/L) corrected Tcell',
+        '[H2O] measured corrected Tcell',
+        'Total Flow (sccm) corrected Tcell',
+    ]
+
+    def __init__(self, df: Optional[pd.DataFrame] = None, copy: bool = True):
+        """
+        Args:
+            df: Profile data; may be omitted when only the row-wise
+                calculations are run on chunks
+            copy: Work on a deep copy of `df`. With copy=False the columns
+                of `df` are shared (pandas copy-on-write, the default from
+                pandas 3.0): a column is only copied when a calculation
+                rewrites it, and new columns never reach `df`.
+        """
+        if df is not None:
+            df = df.copy(deep=copy)
+        self.df = df
         self.calculation_log = []
+        # Steps of STEPS already computed on self.df
+        self.computed = set()
         self.pressure_column = 'Hydrostatic pressure (bar)'
 
     def add_cast_direction(self) -> pd.DataFrame:
@@ -19,59 +79,200 @@ class DerivedParameters:
     def clean_cast_direction(self, pressure_threshold: float = 0.01) -> pd.DataFrame:
         """Clean and separate casts based on maximum pressure"""
         max_pressure_idx = self.df[self.pressure_column].idxmax()
+        split = self.df.index.get_loc(max_pressure_idx)
+        pressure = self.df[self.pressure_column].to_numpy(dtype=float, na_value=np.nan)
         
-        # Split into down/up casts
-        downcast = self.df.iloc[:max_pressure_idx + 1].copy()
-        upcast = self.df.iloc[max_pressure_idx:].copy()
-        
-        # Clean transitions
-        pressure_grad_down = downcast[self.pressure_column].diff()
-        pressure_grad_up = upcast[self.pressure_column].diff()
-        
-        downcast = downcast[pressure_grad_down >= -pressure_threshold]
-        upcast = upcast[pressure_grad_up <= pressure_threshold]
-        
-        # Label casts
-        downcast['is_downcast'] = True
-        upcast['is_downcast'] = False
+        # Down/up casts share the maximum; clean transitions in each
+        with np.errstate(invalid='ignore'):
+            grad_down = np.diff(pressure[:split + 1], prepend=np.nan)
+            grad_up = np.diff(pressure[split:], prepend=np.nan)
+        keep_down = np.flatnonzero(grad_down >= -pressure_threshold)
+        keep_up = split + np.flatnonzero(grad_up <= pressure_threshold)
         
-        self.df = pd.concat([downcast, upcast])
+        # One row selection instead of copying and concatenating both halves
+        self.df = self.df.iloc[np.concatenate([keep_down, keep_up])]
+        self.df['is_downcast'] = np.arange(len(self.df)) < len(keep_down)
         self.calculation_log.append("Cleaned cast direction")
         return self.df
     
+    def segment_casts(self, pressure_threshold: float = 0.01, **options) -> pd.DataFrame:
+        """
+        Label every sample with its cast index and direction (yo-yo records)
+
+        Records holding several down/up casts keep all of them instead of being
+        split at the single pressure maximum; `options` (window, hysteresis,
+        min_fraction) are passed to CastProcessor.segment_casts. Samples moving
+        against their cast direction by more than `pressure_threshold` are
+        dropped, like in clean_cast_direction. Rows without pressure or time
+        (blanked by filter_flagged_rows) belong to no cast and are dropped.
+        """
+        blank = self.df[self.pressure_column].isna()
+        if 'datetime' in self.df.columns:
+            blank |= self.df['datetime'].isna()
+        if blank.any():
+            self.df = self.df[~blank.to_numpy()]
+        # self.df is already our own frame, no need for another copy
+        self.df = CastProcessor(self.pressure_column).segment_casts(
+            self.df, pressure_threshold=pressure_threshold, copy=False, **options)
+        self.calculation_log.append(f"Segmented {self.df['cast'].nunique()} casts")
+        return self.df
+
+    def _seconds(self) -> np.ndarray:
+        """datetime column as float seconds since the first sample
+
+        Raises ValueError on missing timestamps: rows blanked by flag
+        filtering are dropped by segment_casts before any time-based step.
+        """
+        t = self.df['datetime'].to_numpy(dtype='datetime64[ns]')
+        if np.isnat(t).any():
+            raise ValueError("Time-based calculations need a datetime value in every row")
+        return (t - t[0]).astype(np.int64) / 1e9
+
+    def estimate_time_delays(self,
+                             columns: List[str],
+                             reference: Optional[str] = None,
+                             max_delay: float = 120.0) -> pd.DataFrame:
+        """
+        Estimate the delay of gas signals behind a reference by FFT cross-correlation
+        
+        All columns and the reference are interpolated on one regular time grid
+        (median sampling interval, gaps filled) and cross-correlated with the
+        reference in a single FFT over all columns; each lag is normalized to a
+        Pearson correlation over the overlapping samples. The delay is the lag
+        in [0, max_delay] s of the strongest correlation (either sign), refined
+        to a fraction of a sample by a parabola through the peak.
+        
+        Args:
+            columns: Gas columns to estimate the delay of
+            reference: Signal the gas follows, by default the hydrostatic pressure
+            max_delay: Longest delay searched, in seconds
+            
+        Returns:
+            DataFrame indexed by column with 'delay' (s) and the peak
+            'correlation'; a weak correlation means the delay is unreliable.
+            Columns with fewer than 2 valid samples get NaN for both.
+        """
+        reference = reference or self.pressure_column
+        columns = [col for col in columns if col in self.df.columns]
+        usable = [col for col in columns if self.df[col].notna().sum() >= 2]
+        for column in set(columns) - set(usable):
+            self.calculation_log.append(f"Skipped {column} - fewer than 2 valid samples")
+        if not usable:
+            return pd.DataFrame({'delay': np.nan, 'correlation': np.nan},
+                                index=pd.Index(columns, name='column'))
+        t = self._seconds()
+        dt = np.median(np.diff(t))
+        grid = np.arange(0, t[-1] + dt / 2, dt)
+
+        def regular(values: np.ndarray) -> np.ndarray:
+            valid = ~np.isnan(values)
+            signal = np.interp(grid, t[valid], values[valid])
+            return (signal - signal.mean()) / (signal.std() or 1)
+
+        x = np.column_stack([regular(self.df[col].to_numpy(dtype=float, na_value=np.nan))
+                             for col in usable])
+        y = regular(self.df[reference].to_numpy(dtype=float, na_value=np.nan))
+
+        n = len(grid)
+        nfft = 1 << (2 * n - 1).bit_length()
+        spectrum = np.fft.rfft(x, nfft, axis=0) * np.conj(np.fft.rfft(y, nfft))[:, None]
+        max_lag = min(int(max_delay / dt), n - 1)
+        # Pearson correlation of x[t + k] with y[t] over their overlap, for each
+        # lag k (x lags y by k samples). The overlaps are the suffixes x[k:] and
+        # the prefixes y[:n - k]: their sums accumulate exactly the samples of
+        # the overlap (from the end for x), never a difference of running sums,
+        # so an outlier does not cancel the precision of the other lags
+        lags = np.arange(max_lag + 1)
+        m = (n - lags)[:, None]
+        sxy = np.fft.irfft(spectrum, nfft, axis=0)[:max_lag + 1]
+        sx = np.cumsum(x[::-1], axis=0)[::-1][lags]
+        sx2 = np.cumsum(x[::-1] ** 2, axis=0)[::-1][lags]
+        sy = np.cumsum(y)[n - lags - 1][:, None]
+        sy2 = np.cumsum(y ** 2)[n - lags - 1][:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cc = (sxy - sx * sy / m) / np.sqrt((sx2 - sx ** 2 / m) * (sy2 - sy ** 2 / m))
+        cc = np.nan_to_num(cc)
+
+        peak = np.abs(cc).argmax(axis=0)
+        cols = np.arange(len(usable))
+        offset = np.zeros(len(usable))
+        inner = (peak > 0) & (peak < max_lag)
+        if inner.any():
+            left = np.abs(cc[peak[inner] - 1, cols[inner]])
+            centre = np.abs(cc[peak[inner], cols[inner]])
+            right = np.abs(cc[peak[inner] + 1, cols[inner]])
+            curvature = left - 2 * centre + right
+            with np.errstate(divide='ignore', invalid='ignore'):
+                offset[inner] = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0)
+
+        delays = pd.DataFrame({'delay': (peak + offset) * dt,
+                               'correlation': cc[peak, cols]},
+                              index=pd.Index(usable, name='column')).reindex(pd.Index(columns, name='column'))
+        self.calculation_log.append(f"Estimated time delays against {reference}")
+        return delays
+
     def apply_time_delay_correction(self, 
                                   columns: List[str], 
-                                  time_delay: float = 20.0) -> pd.DataFrame:
+                                  time_delay=20.0,
+                                  min_correlation: float = 0.3) -> pd.DataFrame:
         """
         Apply time delay correction to gas measurements.
         
+        Each value is replaced by the signal interpolated `time_delay` seconds
+        later on the real datetime axis, so the delay need not be a whole number
+        of samples and irregular sampling is respected. Beyond the last sample
+        the last value is held. All columns sharing a delay are shifted in one
+        vectorized operation.
+        
         Args:
             columns: List of gas measurement columns to correct
-            time_delay: Time delay in seconds based on carrier gas flow
+            time_delay: Time delay in seconds based on carrier gas flow, a dict
+                of delays per column, or None to estimate them for this profile
+                with estimate_time_delays
+            min_correlation: With time_delay=None, columns whose estimate
+                correlates more weakly than this are left uncorrected
             
         Returns:
             DataFrame with corrected gas measurements
         """
-        if 'datetime' not in self.df.columns:
+        if 'datetime' not in self.df.columns or len(self.df) < 2:
             self.calculation_log.append("Skipped time delay - missing datetime column")
             return self.df
 
-        # Calculate sampling frequency using datetime column
-        time_diff = self.df['datetime'].diff().median()
-        sampling_freq = 1 / time_diff.total_seconds()
-    
-        shift_periods = int(time_delay * sampling_freq)
-        
-        # Apply shift to each gas column
         for column in columns:
-            if column in self.df.columns:
-                # Shift measurements forward by delay period
-                self.df[column] = self.df[column].shift(-shift_periods).fillna(method='ffill')
-                
-                self.calculation_log.append(
-                    f"Applied {time_delay:.1f}s delay correction to {column}")
-            else:
+            if column not in self.df.columns:
                 self.calculation_log.append(f"Skipped {column} - column not found")
+        columns = [col for col in columns if col in self.df.columns]
+
+        if time_delay is None:
+            estimates = self.estimate_time_delays(columns)
+            reliable = estimates['correlation'].abs() >= min_correlation
+            for column in estimates.index[~reliable]:
+                self.calculation_log.append(f"Skipped {column} - no reliable delay estimate")
+            delays = estimates.loc[reliable, 'delay'].to_dict()
+        elif isinstance(time_delay, dict):
+            delays = {col: time_delay[col] for col in columns if col in time_delay}
+        else:
+            delays = {col: time_delay for col in columns}
+        if not delays:
+            return self.df
+
+        t = self._seconds()
+        for delay in set(delays.values()):
+            shifted = [col for col, d in delays.items() if d == delay]
+            # Bracketing samples and interpolation weight of t + delay
+            target = t + delay
+            i = np.clip(np.searchsorted(t, target, side='right') - 1, 0, len(t) - 2)
+            span = t[i + 1] - t[i]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                w = np.clip(np.where(span > 0, (target - t[i]) / span, 0), 0, 1)[:, None]
+            values = self.df[shifted].to_numpy(dtype=float, na_value=np.nan)
+            before, after = values[i], values[i + 1]
+            self.df[shifted] = np.where(w == 0, before, np.where(w == 1, after, before * (1 - w) + after * w))
+            for column in shifted:
+                self._invalidate(column)
+                self.calculation_log.append(
+                    f"Applied {delay:.1f}s delay correction to {column}")
                 
         return self.df
     
@@ -80,76 +281,245 @@ class DerivedParameters:
         self.df[f"{column}_no_moving_average"] = self.df[column]
         self.df[f"{column}"] = self.df[column].rolling(
             window=window, center=True).mean()
+        self._invalidate(column)
         self.calculation_log.append(f"Applied {window}-point moving average to {column}")
         return self.df
-        
 
-    def has_required_columns(self, columns: List[str]) -> bool:
+    def apply_rolling_filters(self, columns: List[str], window: float = 10.0,
+                              method: str = 'mean', polyorder: int = 2,
+                              keep_original: bool = False) -> pd.DataFrame:
+        """
+        Smooth several columns at once with a centered time window
+
+        Parameters
+        ----------
+        columns : list of str
+            Columns to filter, processed together as one 2D block
+        window : float
+            Window width in seconds of the datetime column (samples are taken
+            as 1 s apart without it). Gaps in time are respected: a window
+            only holds the samples within window / 2 of its center.
+        method : str
+            'mean' (one vectorized sum per window), 'median' (time-based rolling
+            median) or 'savgol' (Savitzky-Golay of order `polyorder`, applied
+            to each stretch of regular sampling between gaps)
+        keep_original : bool
+            Store the unfiltered values as `<column>_unfiltered`; off by
+            default so no extra copy of the columns is kept
+
+        NaNs are skipped by 'mean' and 'median'; 'savgol' fills them by linear
+        interpolation before filtering and leaves them NaN in the result.
+        """
+        t = self._seconds() if 'datetime' in self.df.columns else np.arange(len(self.df), dtype=float)
+        if np.any(np.diff(t) < 0):
+            raise ValueError("Rolling filters need increasing datetime values")
+        values = self.df[columns].to_numpy(dtype=float, na_value=np.nan)
+
+        if method == 'mean':
+            lo = np.searchsorted(t, t - window / 2, side='left')
+            hi = np.searchsorted(t, t + window / 2, side='right')
+            valid = ~np.isnan(values)
+            # Every window is summed on its own samples (reduceat over the
+            # interleaved window bounds): a difference of global running sums
+            # would lose the precision of all windows after a huge sample.
+            # A trailing zero row keeps the end bounds within the array
+            padded = np.vstack([np.where(valid, values, 0.0), np.zeros(len(columns))])
+            sums = np.add.reduceat(padded, np.column_stack([lo, hi]).ravel(), axis=0)[::2]
+            counts = np.zeros((len(t) + 1, len(columns)), dtype=np.int64)
+            np.cumsum(valid, axis=0, out=counts[1:])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                filtered = sums / (counts[hi] - counts[lo])
+        elif method == 'median':
+            frame = pd.DataFrame(values, index=pd.to_datetime(t, unit='s'))
+            filtered = frame.rolling(pd.Timedelta(seconds=window), center=True,
+                                     closed='both', min_periods=1).median().to_numpy()
+        elif method == 'savgol':
+            filtered = self._savgol(t, values, window, polyorder)
+        else:
+            raise ValueError(f"Unknown rolling filter '{method}'")
+
+        if keep_original:
+            self.df[[f"{column}_unfiltered" for column in columns]] = values
+        self.df[columns] = filtered
+        for column in columns:
+            self._invalidate(column)
+        self.calculation_log.append(f"Applied {window} s rolling {method} to {len(columns)} columns")
+        return self.df
+
+    @staticmethod
+    def _savgol(t: np.ndarray, values: np.ndarray, window: float, polyorder: int) -> np.ndarray:
+        """Savitzky-Golay filter of each regularly sampled stretch of `values`"""
+        from scipy.signal import savgol_filter
+
+        filtered = values.copy()
+        if len(t) < 2:
+            return filtered
+        dt = np.median(np.diff(t))
+        # A step of more than 1.5 sampling intervals is a gap
+        breaks = np.flatnonzero(np.diff(t) > 1.5 * dt) + 1
+        length = int(round(window / dt)) // 2 * 2 + 1
+        index = np.arange(len(t))
+        for segment in np.split(index, breaks):
+            # Shorten the window on stretches shorter than it
+            n = min(length, (len(segment) - 1) // 2 * 2 + 1)
+            if n <= polyorder:
+                continue
+            block = values[segment]
+            for k in range(block.shape[1]):
+                valid = ~np.isnan(block[:, k])
+                if valid.sum() > 1 and not valid.all():
+                    block[:, k] = np.interp(segment, segment[valid], block[valid, k])
+            filtered[segment] = np.where(np.isnan(values[segment]), np.nan,
+                                         savgol_filter(block, n, polyorder, axis=0, mode='interp'))
+        return filtered
+
+
+    def has_required_columns(self, columns: List[str],
+                             df: Optional[pd.DataFrame] = None) -> bool:
         """Check if all required columns exist"""
-        return all(col in self.df.columns for col in columns)
+        df = self.df if df is None else df
+        return all(col in df.columns for col in columns)
 
-    def calculate_flows(self) -> pd.DataFrame:
-        """Calculate flow parameters with safety checks"""
+    def calculate_flows(self, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Calculate flow parameters with safety checks
+        
+        The calculation is row-wise: pass `df` (e.g. a chunk from
+        Profile.iter_chunks) to compute it in place on that frame instead of self.df.
+        """
+        df = self.df if df is None else df
         required_cols = ['Total Flow (sccm)', 'Flow Carrier Gas (sccm)', '[H2O] measured (%)']
         
-        if self.has_required_columns(required_cols):
-            self.df['Dry gas Flow [sccm]'] = (
-                self.df['Total Flow (sccm)'] - 
-                self.df['Flow Carrier Gas (sccm)'] - 
-                self.df['Total Flow (sccm)'] * self.df['[H2O] measured (%)'] / 100
+        if self.has_required_columns(required_cols, df):
+            df['Dry gas Flow [sccm]'] = (
+                df['Total Flow (sccm)'] - 
+                df['Flow Carrier Gas (sccm)'] - 
+                df['Total Flow (sccm)'] * df['[H2O] measured (%)'] / 100
             )
             
-            self.df['Water_vapour flow [sccm]'] = (
-                self.df['Total Flow (sccm)'] * 
-                self.df['[H2O] measured (%)'] / 100
+            df['Water_vapour flow [sccm]'] = (
+                df['Total Flow (sccm)'] * 
+                df['[H2O] measured (%)'] / 100
             )
             self.calculation_log.append("Calculated flow parameters")
         else:
             self.calculation_log.append("Skipped flow calculations - missing columns")
         
-        return self.df
+        return df
     
-    def calculate_gas_corrections(self) -> pd.DataFrame:
-        """Apply temperature corrections with safety checks"""
-        # CH4 correction
-        ch4_cols = ['[CH4] dissolved with water vapour (ppm)', 'Cellule Temperature (Degree Celsius)']
-        if self.has_required_columns(ch4_cols):
-            self.df["[CH4] dissolved with water vapour (ppm) corrected Tcell"] = (
-                self.df["[CH4] dissolved with water vapour (ppm)"] /
-                (0.925*(self.df['Cellule Temperature (Degree Celsius)']-40)/100+1)
-            )
-            self.df["[CH4] dissolved with water vapour (nmol/L) corrected Tcell"] = (
-                self.df["[CH4] dissolved with water vapour (ppm)"] /
-                (0.925*(self.df['Cellule Temperature (Degree Celsius)']-40)/100+1)
-            )
-            self.calculation_log.append("Applied CH4 temperature correction")
-        else:
-            self.calculation_log.append("Skipped CH4 correction - missing columns")
-            
-        # H2O correction
-        h2o_cols = ['[H2O] measured (%)', 'Cellule Temperature (Degree Celsius)']
-        if self.has_required_columns(h2o_cols):
-            self.df['[H2O] measured corrected Tcell'] = (
-                 self.df['[H2O] measured (%)']/100 /
-                (2.469*(self.df['Cellule Temperature (Degree Celsius)']-40)/100+1)
-            )
-            self.calculation_log.append("Applied H2O temperature correction")
-            
-        else:
-            self.calculation_log.append("Skipped H2O correction - missing columns")
-        #Add correction on total gas flow 
-        self.df["Total Flow (sccm) corrected Tcell"] = self.df['Dry gas Flow [sccm]'] + self.df['[H2O] measured corrected Tcell']+self.df['Flow Carrier Gas (sccm)']
-        return self.df
+    def correct_ch4_tcell(self, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """CH4 cell temperature correction"""
+        df = self.df if df is None else df
+        factor = 0.925*(df['Cellule Temperature (Degree Celsius)']-40)/100+1
+        df["[CH4] dissolved with water vapour (ppm) corrected Tcell"] = (
+            df["[CH4] dissolved with water vapour (ppm)"] / factor
+        )
+        df["[CH4] dissolved with water vapour (nmol/L) corrected Tcell"] = (
+            df["[CH4] dissolved with water vapour (ppm)"] / factor
+        )
+        self.calculation_log.append("Applied CH4 temperature correction")
+        return df
+
+    def correct_h2o_tcell(self, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """H2O cell temperature correction"""
+        df = self.df if df is None else df
+        df['[H2O] measured corrected Tcell'] = (
+             df['[H2O] measured (%)']/100 /
+            (2.469*(df['Cellule Temperature (Degree Celsius)']-40)/100+1)
+        )
+        self.calculation_log.append("Applied H2O temperature correction")
+        return df
+
+    def correct_total_flow_tcell(self, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Correction on total gas flow"""
+        df = self.df if df is None else df
+        df["Total Flow (sccm) corrected Tcell"] = df['Dry gas Flow [sccm]'] + df['[H2O] measured corrected Tcell']+df['Flow Carrier Gas (sccm)']
+        self.calculation_log.append("Applied total flow temperature correction")
+        return df
+
+    def calculate_gas_corrections(self, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Apply temperature corrections with safety checks
+        
+        Row-wise like calculate_flows, so `df` may be a chunk as well. The flows
+        the total flow correction needs are computed first if missing.
+        """
+        return self.compute(self.GAS_CORRECTION_OUTPUTS, df)
+
+    @classmethod
+    def _resolve(cls, outputs: List[str]) -> List[str]:
+        """Steps needed for `outputs`, ancestors first"""
+        producers = {column: name for name, step in cls.STEPS.items() for column in step.outputs}
+        order: List[str] = []
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            for column in cls.STEPS[name].inputs:
+                if column in producers:
+                    visit(producers[column])
+            order.append(name)
+
+        for column in outputs:
+            if column not in producers:
+                raise KeyError(f"No derived step produces '{column}'")
+            visit(producers[column])
+        return order
+
+    @classmethod
+    def required_columns(cls, outputs: List[str]) -> List[str]:
+        """L0 columns read to compute `outputs`"""
+        steps = cls._resolve(outputs)
+        produced = {column for name in steps for column in cls.STEPS[name].outputs}
+        columns = [column for name in steps for column in cls.STEPS[name].inputs
+                   if column not in produced]
+        return list(dict.fromkeys(columns))
+
+    def compute(self, outputs: List[str], df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Compute derived columns and only the steps they depend on
+        
+        Example: derived.compute(['Total Flow (sccm) corrected Tcell']) runs the
+        flows, the H2O correction and the total flow correction, but not the
+        CH4 correction.
+        
+        On self.df, results are memoized: steps already computed for this
+        profile are not run again, unless an input was modified since (moving
+        average, time delay correction). Steps whose L0 inputs are missing are
+        skipped, together with the steps depending on them.
+        """
+        memoize = df is None
+        df = self.df if df is None else df
+        for name in self._resolve(outputs):
+            step = self.STEPS[name]
+            if memoize and name in self.computed and self.has_required_columns(step.outputs, df):
+                continue
+            if not self.has_required_columns(step.inputs, df):
+                self.calculation_log.append(f"Skipped {name} - missing columns")
+                continue
+            getattr(self, step.method)(df)
+            if memoize:
+                self.computed.add(name)
+        return df
+
+    def _invalidate(self, column: str) -> None:
+        """Forget memoized steps that depend on a modified column"""
+        stale = {column}
+        for name in self._resolve([c for step in self.STEPS.values() for c in step.outputs]):
+            step = self.STEPS[name]
+            if stale & set(step.inputs):
+                self.computed.discard(name)
+                stale.update(step.outputs)
 
     def calculate_all(self) -> pd.DataFrame:
         """Run all calculations in correct order"""
         
-        # First add cast direction
-        self.clean_cast_direction(pressure_threshold=0.03)
+        # First split the record into casts
+        self.segment_casts(pressure_threshold=0.03)
         
         # Rest of processing
         self.apply_moving_average('[H2O] measured (%)', 10)
-        self.calculate_flows()
+        self.compute(self.STEPS['flows'].outputs)
         #Comment gas_correction because need to check with emeline if already corrected. 
         #self.calculate_gas_corrections()
         return self.df
@@ -1,60 +1,251 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from numpy.lib.stride_tricks import sliding_window_view
 import logging
+import warnings
+from .quality_report import quality_table
+
+# Scale turning the MAD into a standard deviation estimate for normal data
+MAD_SCALE = 1.4826
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate with the P² algorithm (Jain & Chlamtac, 1985)
+
+    Keeps five markers instead of the data, so memory and cost per sample are
+    constant however long the acquisition runs.
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self._initial: List[float] = []
+        self.heights = np.zeros(5)
+        self.positions = np.arange(5, dtype=float)
+        self.desired = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def update(self, values) -> None:
+        """Add observations, NaNs are skipped"""
+        for x in np.asarray(values, dtype=float):
+            if np.isnan(x):
+                continue
+            self.count += 1
+            if self.count <= 5:
+                self._initial.append(x)
+                if self.count == 5:
+                    self.heights = np.sort(self._initial)
+                continue
+            self._add(x)
+
+    def _add(self, x: float) -> None:
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = int(np.searchsorted(q, x, side='right')) - 1
+        n[k + 1:] += 1
+        self.desired += self.increments
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1.0 if d > 0 else -1.0
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    j = i + int(d)
+                    q[i] = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                n[i] += d
+
+    @property
+    def value(self) -> float:
+        """Current estimate (exact while fewer than five values were seen)"""
+        if self.count == 0:
+            return np.nan
+        if self.count < 5:
+            return float(np.quantile(self._initial, self.p))
+        return float(self.heights[2])
+
+
+class RunningMoments:
+    """Streaming mean and standard deviation, merged chunk by chunk (Chan et al.)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        count, mean = len(values), values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+class RollingMAD:
+    """
+    Median and MAD over the last `window` samples, carried across chunks
+
+    Each sample is compared with the window ending at it, so a chunk gives the
+    same result as the whole series; only the last window - 1 values are kept.
+    """
+
+    def __init__(self, window: int = 300):
+        self.window = window
+        self._history = np.full(window - 1, np.nan)
+
+    def update(self, values):
+        """Rolling median and MAD at each of `values`"""
+        values = np.asarray(values, dtype=float)
+        series = np.concatenate([self._history, values])
+        windows = sliding_window_view(series, self.window)
+        with warnings.catch_warnings():
+            # Windows that are still all NaN at the start of a stream
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nanmedian(windows, axis=1)
+            mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+        self._history = series[len(series) - (self.window - 1):]
+        return median, mad
+
+
 class ErrorHandler:
-    def __init__(self, method: str = 'iqr', zscore_threshold: float = 3.0, iqr_threshold: float = 1.5):
+    def __init__(self, method: str = 'iqr', zscore_threshold: float = 3.0, iqr_threshold: float = 1.5,
+                 mad_threshold: float = 3.5, window: int = 300):
         """
         Initialize error handler with method-specific thresholds
-        
+
         Parameters
         ----------
         method : str
-            'zscore' (sigma rule) or 'iqr' (Tukey's method)
+            'zscore' (sigma rule), 'iqr' (Tukey's method) or 'mad' (median
+            absolute deviation)
         zscore_threshold : float
             Number of standard deviations for z-score method
         iqr_threshold : float
             Multiplier for IQR in Tukey's method
+        mad_threshold : float
+            Number of scaled MADs (MAD * 1.4826) for the MAD method
+        window : int
+            Samples of the rolling window of the MAD method in online mode
+            (process_chunk); the batch methods use the whole column
         """
         self.method = method
         self.thresholds = {
             'zscore': zscore_threshold,
-            'iqr': iqr_threshold
+            'iqr': iqr_threshold,
+            'mad': mad_threshold
         }
+        self.window = window
+        self._streams: Dict[str, object] = {}
         self.logger = logging.getLogger(__name__)
-        
-    def process_error_standard(self, df: pd.DataFrame, column: str = 'Error Standard') -> pd.DataFrame:
+
+    def process_error_standard(self, df: pd.DataFrame, column: str = 'Error Standard',
+                               inplace: bool = False) -> pd.DataFrame:
         """Process Error Standard values using chosen outlier detection method"""
-        df = df.copy()
-        data = df[column]
-        
-        if self.method == 'zscore':
-            mean = data.mean()
-            std = data.std()
-            mask = (data - mean).abs() <= self.thresholds['zscore'] * std
-            
+        return self.process_columns(df, [column], inplace=inplace)
+
+    def outlier_mask(self, df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """
+        Outliers of several columns in one vectorized pass (True = outlier)
+
+        Bounds are computed per column over the whole frame; NaNs count as outliers.
+        """
+        data = df[columns].to_numpy(dtype=float, na_value=np.nan)
+        threshold = self.thresholds[self.method]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if self.method == 'zscore':
+                mean = np.nanmean(data, axis=0)
+                std = np.nanstd(data, axis=0, ddof=1)
+                lower, upper = mean - threshold * std, mean + threshold * std
+            elif self.method == 'iqr':
+                q1, q3 = np.nanquantile(data, [0.25, 0.75], axis=0)
+                iqr = q3 - q1
+                lower, upper = q1 - threshold * iqr, q3 + threshold * iqr
+            elif self.method == 'mad':
+                median = np.nanmedian(data, axis=0)
+                mad = np.nanmedian(np.abs(data - median), axis=0)
+                lower, upper = median - threshold * MAD_SCALE * mad, median + threshold * MAD_SCALE * mad
+            else:
+                raise ValueError(f"Unknown outlier method '{self.method}'")
+        mask = ~((data >= lower) & (data <= upper))
+        return pd.DataFrame(mask, columns=columns, index=df.index)
+
+    def process_columns(self, df: pd.DataFrame, columns: List[str], inplace: bool = False) -> pd.DataFrame:
+        """Set the outliers of several columns to NaN in one masked assignment"""
+        if not inplace:
+            df = df.copy()
+        mask = self.outlier_mask(df, columns)
+        df[columns] = df[columns].mask(mask)
+        for column in columns:
+            self.logger.info(f"Removed {mask[column].sum()} {column} outliers using {self.method} method")
+        return df
+
+    def process_chunk(self, df: pd.DataFrame, column: str = 'Error Standard') -> pd.DataFrame:
+        """
+        Online mode: set the outliers of a chunk to NaN, in place
+
+        The bounds are streaming estimates updated with every chunk: running
+        mean/std ('zscore'), P² quartiles ('iqr') or the rolling median/MAD
+        over the last `window` samples ('mad'). Chunks must come in acquisition
+        order, e.g. from ProfileTail.read_new; call reset() before a new profile.
+        """
+        values = df[column].to_numpy(dtype=float, na_value=np.nan)
+        threshold = self.thresholds[self.method]
+
+        if self.method == 'mad':
+            stream = self._streams.setdefault(column, RollingMAD(self.window))
+            median, mad = stream.update(values)
+            lower, upper = median - threshold * MAD_SCALE * mad, median + threshold * MAD_SCALE * mad
         elif self.method == 'iqr':
-            q1 = data.quantile(0.25)
-            q3 = data.quantile(0.75)
-            iqr = q3 - q1
-            mask = (data >= q1 - self.thresholds['iqr'] * iqr) & (data <= q3 + self.thresholds['iqr'] * iqr)
-        
-        df.loc[~mask, column] = np.nan
-        self.logger.info(f"Removed {(~mask).sum()} {column} outliers using {self.method} method")
-        
+            q1, q3 = self._streams.setdefault(column, (P2Quantile(0.25), P2Quantile(0.75)))
+            q1.update(values)
+            q3.update(values)
+            iqr = q3.value - q1.value
+            lower, upper = q1.value - threshold * iqr, q3.value + threshold * iqr
+        elif self.method == 'zscore':
+            stream = self._streams.setdefault(column, RunningMoments())
+            stream.update(values)
+            lower, upper = stream.mean - threshold * stream.std, stream.mean + threshold * stream.std
+        else:
+            raise ValueError(f"Unknown outlier method '{self.method}'")
+
+        with np.errstate(invalid='ignore'):
+            # Bounds that are not defined yet (too few samples) flag nothing
+            outliers = (values < lower) | (values > upper)
+        df[column] = np.where(outliers, np.nan, values)
+        self.logger.info(f"Removed {outliers.sum()} {column} outliers using online {self.method} method")
         return df
+
+    def reset(self) -> None:
+        """Forget the streaming estimates of process_chunk"""
+        self._streams = {}
+
     def get_quality_metrics(self, df: pd.DataFrame, column: str = 'Error Standard') -> Dict[str, Optional[float]]:
         """Calculate quality metrics for the specified column in the DataFrame"""
-        data = df[column].dropna()
-        metrics = {
-            'mean': data.mean(),
-            'std': data.std(),
-            'min': data.min(),
-            'max': data.max(),
-            '25%': data.quantile(0.25),
-            '50%': data.median(),
-            '75%': data.quantile(0.75),
-            'count': data.count()
-        }
+        metrics = quality_table(df, [column]).loc[column].to_dict()
+        metrics['count'] = int(metrics['count'])
         self.logger.info(f"Calculated quality metrics for {column}")
-        return metrics
\ No newline at end of file
+        return metrics
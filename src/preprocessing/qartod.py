@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+from numpy.lib.stride_tricks import sliding_window_view
+from .qc_flags import QCFlags, QC_FLAG_COLUMN, QC_FLAG_DTYPE
+
+
+def spike_test(values: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    QARTOD spike test: a sample fails when it departs from the mean of its two
+    neighbours by more than `threshold` plus half their own difference, so a
+    steep but smooth gradient is not taken for a spike. End samples pass.
+    """
+    failed = np.zeros(len(values), dtype=bool)
+    if len(values) < 3:
+        return failed
+    before, sample, after = values[:-2], values[1:-1], values[2:]
+    with np.errstate(invalid='ignore'):
+        failed[1:-1] = (np.abs(sample - (before + after) / 2)
+                        - np.abs((after - before) / 2)) > threshold
+    return failed
+
+
+def rate_of_change_test(values: np.ndarray, seconds: np.ndarray, threshold: float) -> np.ndarray:
+    """Fails samples changing faster than `threshold` per second since the previous sample"""
+    failed = np.zeros(len(values), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.abs(np.diff(values)) / np.diff(seconds)
+        failed[1:] = rate > threshold
+    return failed
+
+
+def flat_line_test(values: np.ndarray, count: int, tolerance: float = 0.0) -> np.ndarray:
+    """
+    Stuck sensor test: fails a sample when it and the `count - 1` samples
+    before it all lie within `tolerance` of each other. Windows containing NaN pass.
+    """
+    failed = np.zeros(len(values), dtype=bool)
+    if len(values) < count:
+        return failed
+    windows = sliding_window_view(values, count)
+    with np.errstate(invalid='ignore'):
+        failed[count - 1:] = (windows.max(axis=1) - windows.min(axis=1)) <= tolerance
+    return failed
+
+
+def gradient_test(values: np.ndarray, depth: np.ndarray, threshold: float,
+                  min_depth_step: float = 0.01) -> np.ndarray:
+    """
+    Fails samples whose vertical gradient from the previous sample exceeds
+    `threshold` per meter. Steps of less than `min_depth_step` m (e.g. while
+    the probe turns around) are not tested.
+    """
+    failed = np.zeros(len(values), dtype=bool)
+    dz = np.diff(depth)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gradient = np.abs(np.diff(values) / dz)
+        failed[1:] = (np.abs(dz) >= min_depth_step) & (gradient > threshold)
+    return failed
+
+
+class SensorTests:
+    """
+    QARTOD-style spike, rate-of-change, flat-line and gradient tests
+
+    Parameters
+    ----------
+    config : dict
+        Tests per channel, e.g.
+        {
+            'Cavity Pressure (mbar)': {
+                'spike': 0.05,                                # same unit as the channel
+                'rate_of_change': 0.1,                        # unit per second
+                'flat_line': {'count': 300, 'tolerance': 0},  # samples
+                'gradient': 1.0,                              # unit per meter
+            }
+        }
+        Tests left out of a channel's entry are not run.
+    depth_column : str
+        Vertical coordinate of the gradient test
+
+    Every test is a vectorized NumPy operation over the whole profile; the
+    tests need neighbouring samples, so run them on complete profiles rather
+    than on independent chunks.
+    """
+    TESTS = ['spike', 'rate_of_change', 'flat_line', 'gradient']
+
+    def __init__(self, config: Dict[str, Dict], depth_column: str = 'Depth (meter)'):
+        for channel, tests in config.items():
+            unknown = set(tests) - set(self.TESTS)
+            if unknown:
+                raise ValueError(f"Unknown tests for '{channel}': {sorted(unknown)}")
+        self.config = config
+        self.depth_column = depth_column
+
+    def required_columns(self):
+        """Columns read by the tests"""
+        return list(self.config) + [self.depth_column]
+
+    @property
+    def rules(self) -> Dict[str, str]:
+        """Flag name of every configured test and the channel it invalidates (QCFlags.from_rules)"""
+        return {self.rule_name(channel, test): channel
+                for channel, tests in self.config.items() for test in tests}
+
+    @staticmethod
+    def rule_name(channel: str, test: str) -> str:
+        """Name of the flag of one test of one channel"""
+        return f"{channel} {test}"
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Boolean frame of failed tests (True = invalid), one column per channel and test"""
+        if 'datetime' in df.columns:
+            seconds = df['datetime'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        else:
+            # L0 files are logged at 1 Hz
+            seconds = np.arange(len(df), dtype=float)
+        depth = (df[self.depth_column].to_numpy(dtype=float, na_value=np.nan)
+                 if self.depth_column in df.columns else None)
+
+        results = {}
+        for channel, tests in self.config.items():
+            if channel not in df.columns:
+                continue
+            values = df[channel].to_numpy(dtype=float, na_value=np.nan)
+            if 'spike' in tests:
+                results[self.rule_name(channel, 'spike')] = spike_test(values, tests['spike'])
+            if 'rate_of_change' in tests:
+                results[self.rule_name(channel, 'rate_of_change')] = rate_of_change_test(
+                    values, seconds, tests['rate_of_change'])
+            if 'flat_line' in tests:
+                results[self.rule_name(channel, 'flat_line')] = flat_line_test(
+                    values, **tests['flat_line'])
+            if 'gradient' in tests and depth is not None:
+                results[self.rule_name(channel, 'gradient')] = gradient_test(
+                    values, depth, tests['gradient'])
+        return pd.DataFrame(results, index=df.index)
+
+    def apply(self, df: pd.DataFrame, qc_flags: Optional[QCFlags] = None) -> pd.DataFrame:
+        """
+        Flag `df` in place
+
+        With `qc_flags` every test gets its own bit of the packed QC_FLAGS word,
+        attached to its channel so the flag filters treat it like the range
+        rules. Without, failures are merged into the channel's `*_FLAG` column.
+        """
+        failed = self.evaluate(df)
+        if failed.empty:
+            return df
+        channels = self.rules
+
+        if qc_flags is not None:
+            word = (df[QC_FLAG_COLUMN].to_numpy(dtype=QC_FLAG_DTYPE) if QC_FLAG_COLUMN in df.columns
+                    else QCFlags.empty_word(len(df)))
+            masks = np.array([
+                1 << qc_flags.bit(name, variable=channels[name]) for name in failed.columns
+            ], dtype=QC_FLAG_DTYPE)
+            df[QC_FLAG_COLUMN] = word | np.bitwise_or.reduce(
+                np.where(failed.to_numpy(), masks, QC_FLAG_DTYPE(0)), axis=1, initial=QC_FLAG_DTYPE(0)
+            ).astype(QC_FLAG_DTYPE)
+            return df
+
+        for channel in self.config:
+            columns = [name for name in failed.columns if channels[name] == channel]
+            if columns:
+                flag = failed[columns].any(axis=1)
+                if f"{channel}_FLAG" in df.columns:
+                    flag |= df[f"{channel}_FLAG"].eq(1)
+                df[f"{channel}_FLAG"] = flag.astype(int)
+        return df
@@ -0,0 +1,116 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+# Name of the packed flag column in L1A-L2B products
+QC_FLAG_COLUMN = 'QC_FLAGS'
+# 64 bits leave room for new rules beyond the current configuration
+QC_FLAG_DTYPE = np.uint64
+
+
+class QCFlags:
+    """
+    Registry of validation rules packed as bits of one uint64 QC word per row
+
+    Bit i of the word is set when the rule registered at position i failed
+    (1 = invalid, like the `*_FLAG` columns). A rule is named after the
+    variable it invalidates, or, when a variable has several rules (e.g. the
+    QARTOD sensor tests), registered with its own name and the `variable` it
+    invalidates.
+
+    By default bits are assigned in registration order, which depends on the
+    columns of the frame flagged first. Products compared across profiles
+    should share a fixed layout (from_rules), listing every configured rule
+    whether or not a profile holds its column.
+    """
+    MAX_BITS = np.iinfo(QC_FLAG_DTYPE).bits
+
+    def __init__(self, names: Optional[Iterable[str]] = None):
+        self.bits: Dict[str, int] = {}
+        self.variables: Dict[str, str] = {}
+        self.fixed = False
+        for name in names or []:
+            self.bit(name)
+
+    @classmethod
+    def from_rules(cls, rules: Dict[str, str]) -> 'QCFlags':
+        """
+        Fixed layout: bit i for the i-th rule of `rules` ({rule: variable it
+        invalidates}). Raises ValueError if the rules do not fit in the word;
+        flagging a rule missing from the layout raises KeyError.
+        """
+        if len(rules) > cls.MAX_BITS:
+            raise ValueError(f"{len(rules)} QC rules do not fit in the {cls.MAX_BITS}-bit QC word")
+        flags = cls()
+        for name, variable in rules.items():
+            flags.bit(name, variable)
+        flags.fixed = True
+        return flags
+
+    def bit(self, name: str, variable: Optional[str] = None) -> int:
+        """Bit position of a rule, registering it if needed (unless the layout is fixed)"""
+        if name not in self.bits:
+            if self.fixed:
+                raise KeyError(f"No bit for QC rule '{name}' in the fixed layout")
+            if len(self.bits) >= self.MAX_BITS:
+                raise ValueError(f"QC word is full, cannot add a flag for '{name}'")
+            self.bits[name] = len(self.bits)
+            self.variables[name] = variable or name
+        return self.bits[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.bits)
+
+    @property
+    def flagged_variables(self) -> List[str]:
+        """Variables invalidated by at least one rule, in registration order"""
+        return list(dict.fromkeys(self.variables.values()))
+
+    @staticmethod
+    def empty_word(n_rows: int) -> np.ndarray:
+        return np.zeros(n_rows, dtype=QC_FLAG_DTYPE)
+
+    def set(self, word: np.ndarray, name: str, invalid) -> np.ndarray:
+        """Set the bit of `name` where `invalid` is True; other bits are kept"""
+        bit = QC_FLAG_DTYPE(1 << self.bit(name))
+        return np.asarray(word, dtype=QC_FLAG_DTYPE) | np.where(invalid, bit, QC_FLAG_DTYPE(0))
+
+    def decode(self, word, name: str) -> np.ndarray:
+        """Boolean mask of the rows where `name` is flagged"""
+        return (np.asarray(word, dtype=QC_FLAG_DTYPE) >> QC_FLAG_DTYPE(self.bits[name])) & 1 == 1
+
+    def any(self, word, names: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Boolean mask of the rows where any of `names` (default: all) is flagged"""
+        return (np.asarray(word, dtype=QC_FLAG_DTYPE) & self.mask(names)) != 0
+
+    def mask(self, names: Optional[Iterable[str]] = None) -> QC_FLAG_DTYPE:
+        """
+        Bit mask covering `names` (default: all registered), given as rule or
+        variable names; a variable covers every rule that invalidates it.
+        Unknown names are ignored.
+        """
+        names = self.bits if names is None else set(names)
+        mask = 0
+        for name, bit in self.bits.items():
+            if name in names or self.variables[name] in names:
+                mask |= 1 << bit
+        return QC_FLAG_DTYPE(mask)
+
+    def unpack(self, word, index=None) -> pd.DataFrame:
+        """Per-variable 0/1 flags as `<name>_FLAG` columns, as written by the unpacked mode"""
+        word = np.asarray(word, dtype=QC_FLAG_DTYPE)
+        positions = np.array(list(self.bits.values()), dtype=QC_FLAG_DTYPE)
+        flags = ((word[:, None] >> positions) & 1).astype(int)
+        return pd.DataFrame(flags, columns=[f"{name}_FLAG" for name in self.bits], index=index)
+
+    def to_attrs(self) -> Dict[str, object]:
+        """CF-style flag_masks / flag_meanings attributes describing the word"""
+        meanings = [re.sub(r'_+', '_', re.sub(r'[^a-zA-Z0-9]+', '_', name)).strip('_') + '_invalid'
+                    for name in self.bits]
+        return {
+            'flag_masks': np.array([1 << bit for bit in self.bits.values()], dtype=QC_FLAG_DTYPE),
+            'flag_meanings': ' '.join(meanings),
+            'flag_variables': '; '.join(self.variables.values()),
+        }
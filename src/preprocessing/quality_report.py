@@ -0,0 +1,101 @@
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional
+from .qc_flags import QC_FLAG_COLUMN
+
+STATISTICS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def quality_table(df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Count, mean, std, min, quartiles and max of many columns in one pass
+
+    The columns are taken as one 2D NumPy block, so every statistic is a single
+    reduction over all columns and the three quantiles share one call. NaNs are
+    skipped, like the pandas reductions.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Profile data
+    columns : list of str, optional
+        Columns to describe; by default every numeric column except booleans
+        and the packed QC word
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per column, one column per statistic (see STATISTICS)
+    """
+    if columns is None:
+        columns = [col for col in df.select_dtypes(include='number', exclude='bool').columns
+                   if col != QC_FLAG_COLUMN]
+    data = df[columns].to_numpy(dtype=float, na_value=np.nan)
+
+    with warnings.catch_warnings():
+        # All-NaN columns give NaN statistics
+        warnings.simplefilter('ignore', RuntimeWarning)
+        q1, median, q3 = np.nanquantile(data, QUANTILES, axis=0)
+        table = pd.DataFrame({
+            'count': np.count_nonzero(~np.isnan(data), axis=0),
+            'mean': np.nanmean(data, axis=0),
+            'std': np.nanstd(data, axis=0, ddof=1),
+            'min': np.nanmin(data, axis=0),
+            '25%': q1,
+            '50%': median,
+            '75%': q3,
+            'max': np.nanmax(data, axis=0),
+        }, index=pd.Index(columns, name='variable'))
+    return table
+
+
+class QualityReport:
+    """
+    Expedition-level QC summary, one row per profile and variable
+
+    Profiles are added while they are processed, when their data is already
+    in memory, so the report never reloads L2 files. The result is saved as a
+    small CSV that dashboards can read directly.
+    """
+
+    def __init__(self):
+        self._tables: List[pd.DataFrame] = []
+
+    def add(self, profile: str, df: pd.DataFrame, columns: Optional[List[str]] = None, **info) -> pd.DataFrame:
+        """
+        Describe one profile; `info` (e.g. gas_type='CH4') is repeated on each of its rows
+        """
+        table = quality_table(df, columns).reset_index()
+        table.insert(0, 'profile', profile)
+        for i, (key, value) in enumerate(info.items(), start=1):
+            table.insert(i, key, value)
+        self._tables.append(table)
+        return table
+
+    def add_table(self, table: pd.DataFrame) -> None:
+        """Re-add rows of a saved report, e.g. for a profile that is not reprocessed"""
+        self._tables.append(table.reset_index(drop=True))
+
+    def extend(self, other: 'QualityReport') -> None:
+        """Append the profiles of another report (e.g. filled in a worker process)"""
+        self._tables.extend(other._tables)
+
+    def to_frame(self) -> pd.DataFrame:
+        if not self._tables:
+            return pd.DataFrame(columns=['profile', 'variable'] + STATISTICS)
+        return pd.concat(self._tables, ignore_index=True)
+
+    def save(self, path: Path) -> Path:
+        """Write the report as CSV"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.to_frame().to_csv(path, index=False)
+        return path
+
+    @staticmethod
+    def load(path: Path) -> pd.DataFrame:
+        """Read a saved report, floats exactly as they were computed"""
+        return pd.read_csv(path, float_precision='round_trip')
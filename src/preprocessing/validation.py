@@ -0,0 +1,193 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+from .qc_flags import QCFlags, QC_FLAG_COLUMN, QC_FLAG_DTYPE
+
+
+class CompiledValidator:
+    """
+    VALIDATION_CONFIG compiled into arrays and evaluated in one vectorized pass
+
+    Every rule (standard range or gas rule) becomes one column of a 2D block:
+    the value must lie in [lower, upper] and, for gas rules, the absolute RSD
+    must not exceed the threshold (standard ranges have an infinite threshold).
+    NaN values fail their rule. The result is the same as
+    DataCleaner.validate_data, but with a single comparison per block instead of
+    one pandas expression and assignment per column.
+
+    Compile once and reuse the validator for every profile of an expedition;
+    `stats` accumulates the number of frames, rows and time spent.
+    """
+
+    def __init__(self, validation_config: Dict):
+        standard = validation_config['standard_ranges']
+        gas_rules = validation_config['gas_rules']
+
+        self.columns: List[str] = list(standard) + list(gas_rules)
+        self.rsd_columns: List[Optional[str]] = ([None] * len(standard)
+                                                 + [f"{gas}_RSD" for gas in gas_rules])
+        self.lower = np.array([lo for lo, _ in standard.values()]
+                              + [rules['range'][0] for rules in gas_rules.values()], dtype=float)
+        self.upper = np.array([hi for _, hi in standard.values()]
+                              + [rules['range'][1] for rules in gas_rules.values()], dtype=float)
+        self.rsd_threshold = np.array([np.inf] * len(standard)
+                                      + [rules['rsd_threshold'] for rules in gas_rules.values()],
+                                      dtype=float)
+        # Standard range columns are coerced to numeric like ensure_numeric_columns
+        self.numeric_columns = list(standard)
+        self.stats = {'frames': 0, 'rows': 0, 'seconds': 0.0}
+
+    @property
+    def rules(self) -> Dict[str, str]:
+        """Flag name of every rule and the variable it invalidates (QCFlags.from_rules)"""
+        return {col: col for col in self.columns}
+
+    def _select(self, columns: pd.Index) -> np.ndarray:
+        """Indices of the rules whose column is present in a frame"""
+        return np.array([i for i, col in enumerate(self.columns) if col in columns], dtype=int)
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Boolean frame of failed rules (True = invalid), one column per rule
+        present in `df`. Non-numeric standard range columns of `df` are
+        converted to numeric in place.
+        """
+        for col in self.numeric_columns:
+            if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        rules = self._select(df.columns)
+        columns = [self.columns[i] for i in rules]
+        values = df[columns].to_numpy(dtype=float, na_value=np.nan)
+
+        # |RSD| block, 0 for rules without RSD (always within the infinite threshold)
+        rsd = np.zeros_like(values)
+        gas = [k for k, i in enumerate(rules) if self.rsd_columns[i] is not None]
+        if gas:
+            rsd_columns = [self.rsd_columns[rules[k]] for k in gas]
+            rsd[:, gas] = np.abs(df[rsd_columns].to_numpy(dtype=float, na_value=np.nan))
+
+        with np.errstate(invalid='ignore'):
+            valid = ((values >= self.lower[rules])
+                     & (values <= self.upper[rules])
+                     & (rsd <= self.rsd_threshold[rules]))
+        return pd.DataFrame(~valid, columns=columns, index=df.index)
+
+    def apply(self, df: pd.DataFrame, qc_flags: Optional[QCFlags] = None) -> pd.DataFrame:
+        """
+        Flag `df` in place
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Frame with the RSD columns already computed (DataCleaner.calculate_rsd)
+        qc_flags : QCFlags, optional
+            Bit layout to write a packed QC_FLAGS word with; by default one int
+            `<column>_FLAG` column is written per rule
+        """
+        start = time.perf_counter()
+        invalid = self.evaluate(df)
+
+        if qc_flags is None:
+            flag_columns = [f"{col}_FLAG" for col in invalid.columns]
+            df[flag_columns] = invalid.to_numpy().astype(int)
+        else:
+            masks = np.array([1 << qc_flags.bit(col) for col in invalid.columns], dtype=QC_FLAG_DTYPE)
+            word = (df[QC_FLAG_COLUMN].to_numpy(dtype=QC_FLAG_DTYPE) if QC_FLAG_COLUMN in df.columns
+                    else QCFlags.empty_word(len(df)))
+            df[QC_FLAG_COLUMN] = word | np.bitwise_or.reduce(
+                np.where(invalid.to_numpy(), masks, QC_FLAG_DTYPE(0)), axis=1, initial=QC_FLAG_DTYPE(0)
+            ).astype(QC_FLAG_DTYPE)
+
+        self.stats['frames'] += 1
+        self.stats['rows'] += len(df)
+        self.stats['seconds'] += time.perf_counter() - start
+        return df
+
+    def summary(self) -> str:
+        """One-line timing summary of all frames validated so far"""
+        seconds = self.stats['seconds']
+        rate = self.stats['rows'] / seconds if seconds > 0 else float('nan')
+        return (f"Validated {self.stats['rows']} rows in {self.stats['frames']} frames "
+                f"in {seconds:.3f} s ({rate:,.0f} rows/s)")
+
+
+def sweep_thresholds(frames: Dict[str, pd.DataFrame], column: str,
+                     lower: Sequence[float], upper: Sequence[float],
+                     rsd_threshold: Optional[Sequence[float]] = None,
+                     max_cells: int = 50_000_000) -> pd.DataFrame:
+    """
+    Retained fraction of every profile for every candidate threshold of one rule
+
+    All combinations of `lower` x `upper` (x `rsd_threshold`) are evaluated at
+    once: the rows of all profiles are stacked into one vector, compared with
+    the candidate bounds as a (settings x rows) matrix, and the passing rows
+    are summed per profile with one reduceat. Settings are processed in
+    blocks of at most `max_cells` matrix cells to bound memory.
+
+    Parameters
+    ----------
+    frames : dict of str to pd.DataFrame
+        Profiles by name, e.g. L1A/L2A frames; gas rules need the
+        `<column>_RSD` column written by DataCleaner.calculate_rsd
+    column : str
+        Variable of the rule to tune
+    lower, upper : sequence of float
+        Candidate range bounds
+    rsd_threshold : sequence of float, optional
+        Candidate RSD thresholds (gas rules)
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per profile and setting: profile, lower, upper, rsd_threshold,
+        n_rows and retained_fraction. NaN values are never retained, like in
+        validate_data.
+
+    Example: choose the CH4 range and RSD threshold
+        sweep = sweep_thresholds(profiles, '[CH4] dissolved with water vapour (ppm)',
+                                 lower=[0, 0.5], upper=np.arange(20, 101, 10),
+                                 rsd_threshold=np.logspace(-3, 0, 10))
+        sweep.groupby(['lower', 'upper', 'rsd_threshold'])['retained_fraction'].mean()
+    """
+    names = list(frames)
+    values = np.concatenate([frames[name][column].to_numpy(dtype=float, na_value=np.nan)
+                             for name in names])
+    sizes = np.array([len(frames[name]) for name in names])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    grids = [np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)]
+    if rsd_threshold is not None:
+        grids.append(np.asarray(rsd_threshold, dtype=float))
+        rsd = np.abs(np.concatenate([frames[name][f"{column}_RSD"].to_numpy(dtype=float, na_value=np.nan)
+                                     for name in names]))
+    settings = [grid.ravel() for grid in np.meshgrid(*grids, indexing='ij')]
+    n_settings = len(settings[0])
+
+    counts = np.zeros((n_settings, len(names)), dtype=np.int64)
+    if len(values):
+        block = max(1, max_cells // len(values))
+        # Rows of empty profiles would break reduceat, they keep a count of 0
+        nonempty = sizes > 0
+        with np.errstate(invalid='ignore'):
+            for start in range(0, n_settings, block):
+                rows = slice(start, start + block)
+                passed = ((values >= settings[0][rows, None])
+                          & (values <= settings[1][rows, None]))
+                if rsd_threshold is not None:
+                    passed &= rsd <= settings[2][rows, None]
+                counts[rows][:, nonempty] = np.add.reduceat(passed, offsets[nonempty], axis=1,
+                                                                  dtype=np.int64)
+
+    result = pd.DataFrame({
+        'profile': np.tile(names, n_settings),
+        'lower': np.repeat(settings[0], len(names)),
+        'upper': np.repeat(settings[1], len(names)),
+        'rsd_threshold': (np.repeat(settings[2], len(names)) if rsd_threshold is not None
+                          else np.nan),
+        'n_rows': np.tile(sizes, n_settings),
+    })
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['retained_fraction'] = counts.ravel() / result['n_rows'].to_numpy()
+    return result
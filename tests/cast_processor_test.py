@@ -0,0 +1,92 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+import time
+
+# Add src directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(current_dir), 'src')
+sys.path.append(src_dir)
+
+from preprocessing.cast_processor import CastProcessor, segment_casts
+from preprocessing.derived_parameters import DerivedParameters
+
+def yoyo_pressure(n_casts=4, period=600, depth=3.0, start_deep=False, seed=0):
+    """Noisy yo-yo record of `n_casts` casts at 1 Hz"""
+    t = np.arange(n_casts * period)
+    phase = 2 * np.pi * t / period + (np.pi if start_deep else 0)
+    pressure = depth * (1 - np.cos(phase)) / 2
+    return pressure + np.random.default_rng(seed).normal(0, 0.01, len(t))
+
+def test_yoyo_record_splits_into_casts():
+    pressure = yoyo_pressure(n_casts=4)
+    cast, is_downcast = segment_casts(pressure)
+    assert cast.max() == 3
+    # Each cast is a descent followed by an ascent of half a period each
+    for i in range(4):
+        directions = is_downcast[cast == i]
+        assert directions[:290].all() and not directions[-290:].any()
+        assert abs(directions.sum() - 300) < 15
+
+def test_record_starting_deep_begins_with_upcast():
+    cast, is_downcast = segment_casts(yoyo_pressure(n_casts=3, start_deep=True))
+    assert cast[0] == 0 and not is_downcast[0]
+    assert not is_downcast[cast == 0].any()
+    assert cast.max() == 3
+
+def test_winch_stop_does_not_start_a_cast():
+    # Backing up 2 m (0.2 bar) in the middle of a 30 m descent
+    pressure = np.concatenate([np.linspace(0, 1.5, 500), np.linspace(1.5, 1.3, 60),
+                               np.linspace(1.3, 3.0, 600), np.linspace(3.0, 0, 1000)])
+    pressure += np.random.default_rng(0).normal(0, 0.005, len(pressure))
+    cast, is_downcast = segment_casts(pressure)
+    assert cast.max() == 0
+    assert is_downcast[:1150].all() and not is_downcast[1170:].any()
+    # Without the relative criterion the back-up is its own up/down leg
+    cast, _ = segment_casts(pressure, hysteresis=0.1, min_fraction=0)
+    assert cast.max() == 1
+
+def test_processor_labels_and_cleans_casts():
+    df = pd.DataFrame({'Hydrostatic pressure (bar)': yoyo_pressure(n_casts=2)})
+    df.loc[100, 'Hydrostatic pressure (bar)'] -= 0.5
+    labelled = CastProcessor().segment_casts(df)
+    assert list(labelled.columns) == ['Hydrostatic pressure (bar)', 'cast', 'is_downcast']
+    assert labelled['cast'].nunique() == 2
+
+    derived = DerivedParameters(df)
+    cleaned = derived.segment_casts(pressure_threshold=0.1)
+    # Only the sample jumping up during the descent is dropped
+    assert 100 not in cleaned.index
+    assert len(cleaned) == len(df) - 1
+    pd.testing.assert_frame_equal(cleaned, labelled.drop(index=100))
+
+def test_blanked_rows_do_not_reach_l2():
+    pressure = yoyo_pressure(n_casts=2)
+    df = pd.DataFrame({
+        'datetime': pd.Timestamp('2024-12-11') + pd.to_timedelta(np.arange(len(pressure)), unit='s'),
+        'Hydrostatic pressure (bar)': pressure,
+        '[H2O] measured (%)': 15.0,
+        'Total Flow (sccm)': 8.6,
+        'Flow Carrier Gas (sccm)': 2.0,
+    })
+    # Rows blanked by filter_flagged_rows
+    df.loc[[0, 250, 251, 900], :] = np.nan
+    l2 = DerivedParameters(df).calculate_all()
+    assert l2['datetime'].notna().all()
+    assert l2['Hydrostatic pressure (bar)'].notna().all()
+    assert not l2.index.isin([0, 250, 251, 900]).any()
+
+def test_segmentation_scales_linearly():
+    def duration(n_casts):
+        pressure = yoyo_pressure(n_casts=n_casts)
+        start = time.perf_counter()
+        segment_casts(pressure)
+        return time.perf_counter() - start
+    duration(10)
+    # 20x more samples (about a day at 1 Hz) in well under 20x^2 the time
+    assert duration(2000) < 100 * max(duration(100), 1e-3)
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s'])
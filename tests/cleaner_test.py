@@ -0,0 +1,163 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(current_dir), 'src')
+sys.path.append(src_dir)
+
+from preprocessing.cleaner import DataCleaner
+from preprocessing.derived_parameters import DerivedParameters
+from preprocessing.qc_flags import QCFlags, QC_FLAG_COLUMN, QC_FLAG_DTYPE
+from preprocessing.validation import CompiledValidator, sweep_thresholds
+
+VALIDATION_CONFIG = {
+    'standard_ranges': {
+        'Cavity Pressure (mbar)': (29.5, 30.5),
+        'Cellule Temperature (Degree Celsius)': (39.5, 40.5),
+        'Error Standard': (0, 0.1),
+    },
+    'gas_rules': {
+        '[CH4] dissolved with water vapour (ppm)': {
+            'range': (0, 10),
+            'rsd_threshold': 1e-5
+        },
+    }
+}
+GAS_COLUMNS = list(VALIDATION_CONFIG['gas_rules'].keys())
+
+@pytest.fixture
+def sample_profile_data():
+    return pd.DataFrame({
+        'datetime': pd.date_range('2024-11-27 12:58:45', periods=10, freq='s'),
+        '[CH4] dissolved with water vapour (ppm)': [8.50934, 11.1496, 8.91409, 10.1192,
+                                                   7.99359, 8.55013, 9.12345, 8.76543,
+                                                   10.5432, 9.87654],
+        '[H2O] measured (%)': [15.344, 9.730, 16.463, 13.792, 31.144, 17.327,
+                              14.567, 16.789, 15.432, 14.678],
+        'Error Standard': [0.0120, 0.0090, 0.0059, 0.0039, 0.0115, 0.0135,
+                          0.0078, 0.0094, 0.1156, 0.0088],
+        'Cavity Pressure (mbar)': [30.0469, 30.0469, 29.9375, 29.9531, 30.0469,
+                                  30.0156, 30.1234, 29.8765, 30.0123, 31.0456],
+        'Cellule Temperature (Degree Celsius)': [39.699, 39.696, 39.674, 39.694,
+                                               39.704, 39.711, 39.689, 39.701,
+                                               39.695, 39.698],
+        'Flow Carrier Gas (sccm)': [2.0] * 10,
+        'Total Flow (sccm)': [8.62, 8.68, 8.70, 8.66, 8.61, 8.64, 8.69, 8.63, 8.65, 8.67],
+    })
+
+def test_validate_data_on_chunks(sample_profile_data):
+    whole = DataCleaner(sample_profile_data.copy())
+    whole.calculate_rsd(GAS_COLUMNS)
+    expected = whole.validate_data(VALIDATION_CONFIG)
+    expected = DerivedParameters(expected).calculate_flows()
+    
+    cleaner = DataCleaner(None)
+    derived = DerivedParameters()
+    chunks = []
+    for start in range(0, len(sample_profile_data), 3):
+        chunk = sample_profile_data.iloc[start:start + 3].copy()
+        cleaner.calculate_rsd(GAS_COLUMNS, df=chunk)
+        cleaner.validate_data(VALIDATION_CONFIG, df=chunk)
+        chunks.append(derived.calculate_flows(df=chunk))
+    
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+def _validated(df, packed_flags):
+    cleaner = DataCleaner(df.copy(), packed_flags=packed_flags)
+    cleaner.calculate_rsd(GAS_COLUMNS)
+    cleaner.validate_data(VALIDATION_CONFIG)
+    return cleaner
+
+def test_packed_flags_match_flag_columns(sample_profile_data):
+    unpacked = _validated(sample_profile_data, packed_flags=False)
+    packed = _validated(sample_profile_data, packed_flags=True)
+    
+    flag_columns = [col for col in unpacked.df.columns if col.endswith('_FLAG')]
+    assert packed.df[QC_FLAG_COLUMN].dtype == QC_FLAG_DTYPE
+    assert not any(col.endswith('_FLAG') for col in packed.df.columns)
+    pd.testing.assert_frame_equal(packed.unpack_flags(), unpacked.df[flag_columns])
+    
+    # Filtering gives the same data, the packed word is kept
+    unpacked.filter_flagged_row()
+    unpacked.filter_flagged_rows(columns_to_check=['Error Standard'])
+    packed.filter_flagged_row()
+    packed.filter_flagged_rows(columns_to_check=['Error Standard'])
+    data_columns = list(sample_profile_data.columns)
+    pd.testing.assert_frame_equal(packed.df[data_columns], unpacked.df[data_columns])
+    assert packed.df[QC_FLAG_COLUMN].notna().all()
+
+def test_fixed_flag_layout_shared_by_profiles(sample_profile_data):
+    validator = CompiledValidator(VALIDATION_CONFIG)
+    layout = QCFlags.from_rules(validator.rules)
+    words = []
+    for df in [sample_profile_data, sample_profile_data.drop(columns='Cavity Pressure (mbar)')]:
+        cleaner = DataCleaner(df.copy(), packed_flags=True, qc_flags=layout)
+        cleaner.calculate_rsd(GAS_COLUMNS)
+        words.append(cleaner.validate_data(validator)[QC_FLAG_COLUMN])
+    # A profile without a column keeps the bits of the other rules
+    assert layout.names == validator.columns
+    cavity = layout.mask(['Cavity Pressure (mbar)'])
+    np.testing.assert_array_equal(words[0] & ~cavity, words[1])
+
+    with pytest.raises(KeyError):
+        layout.bit('Depth (meter)')
+    with pytest.raises(ValueError):
+        QCFlags.from_rules({f"rule {i}": f"var {i}" for i in range(QCFlags.MAX_BITS + 1)})
+
+def test_configured_layout_leaves_free_bits():
+    sys.path.append(os.path.join(os.path.dirname(current_dir), 'scripts'))
+    from process_profiles import QC_FLAGS
+    # Room for new validation rules and sensor tests without widening the word
+    assert QCFlags.MAX_BITS - len(QC_FLAGS.names) >= 16
+
+@pytest.mark.parametrize('packed_flags', [False, True])
+def test_compiled_validator_matches_validate_data(sample_profile_data, packed_flags):
+    sample_profile_data.loc[3, 'Cavity Pressure (mbar)'] = np.nan
+    expected = _validated(sample_profile_data, packed_flags).df
+    
+    validator = CompiledValidator(VALIDATION_CONFIG)
+    for _ in range(2):
+        cleaner = DataCleaner(sample_profile_data.copy(), packed_flags=packed_flags)
+        cleaner.calculate_rsd(GAS_COLUMNS)
+        pd.testing.assert_frame_equal(cleaner.validate_data(validator), expected)
+    assert validator.stats['frames'] == 2
+    assert validator.stats['rows'] == 2 * len(sample_profile_data)
+
+@pytest.mark.parametrize('packed_flags', [False, True])
+def test_inplace_filtering_matches_copy(sample_profile_data, packed_flags):
+    copied = _validated(sample_profile_data, packed_flags)
+    copied.filter_flagged_row()
+    copied.filter_flagged_rows(columns_to_check=['Error Standard'])
+    
+    inplace = _validated(sample_profile_data, packed_flags)
+    df = inplace.df
+    inplace.filter_flagged_row(inplace=True)
+    inplace.filter_flagged_rows(columns_to_check=['Error Standard'], inplace=True)
+    
+    assert inplace.df is df
+    pd.testing.assert_frame_equal(inplace.df, copied.df)
+
+def test_threshold_sweep_matches_validation(sample_profile_data):
+    gas = GAS_COLUMNS[0]
+    frames = {}
+    for name, rows in [('a', slice(0, 6)), ('empty', slice(0, 0)), ('b', slice(6, 10))]:
+        frames[name] = DataCleaner(sample_profile_data.iloc[rows].copy()).calculate_rsd(GAS_COLUMNS)
+    
+    sweep = sweep_thresholds(frames, gas, lower=[0, 8.6], upper=[9, 10, 12],
+                             rsd_threshold=[1e-6, 1e-5, 1], max_cells=25)
+    assert len(sweep) == 2 * 3 * 3 * 3
+    for row in sweep.itertuples():
+        config = {'standard_ranges': {},
+                  'gas_rules': {gas: {'range': (row.lower, row.upper), 'rsd_threshold': row.rsd_threshold}}}
+        flags = CompiledValidator(config).apply(frames[row.profile].copy())[f"{gas}_FLAG"]
+        if len(flags):
+            assert row.retained_fraction == pytest.approx((flags == 0).mean())
+        else:
+            assert np.isnan(row.retained_fraction)
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s'])
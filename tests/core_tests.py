@@ -1,9 +1,11 @@
 import pytest
 from pathlib import Path
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import sys
 import os
+import shutil
 
 # Add src directory to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -11,7 +13,11 @@ src_dir = os.path.join(os.path.dirname(current_dir), 'src')
 sys.path.append(src_dir)
 
 from core.data_model import SubOceanMetadata
-from core.profile import Profile
+from core.profile import Profile, ProfileTail
+from core.cache import ParsedFrameCache
+from core.catalog import ExpeditionCatalog
+from core.manifest import ProcessingManifest, fingerprint
+import json
 
 @pytest.fixture
 def sample_metadata_dict():
@@ -54,6 +60,163 @@ def test_profile_loading(sample_profile_data, tmp_path):
     assert len(data) == len(sample_profile_data)
     assert '[CH4] dissolved with water vapour (ppm)' in data.columns
 
+def test_profile_loading_schema(sample_profile_data, tmp_path):
+    data_path = tmp_path / "test_profile.txt"
+    sample_profile_data.assign(**{'Total Flow (sccm)': ['8.6'] * 5 + ['NAN']}).to_csv(
+        data_path, sep='\t', index=False)
+    
+    data, _ = Profile(data_path).load()
+    
+    assert data['Total Flow (sccm)'].dtype == 'float64'
+    assert data['Total Flow (sccm)'].isna().sum() == 1
+    assert data['datetime'].iloc[0] == pd.Timestamp('2024-11-27 12:58:45')
+
+def test_profile_loading_pyarrow(sample_profile_data, tmp_path):
+    pytest.importorskip('pyarrow')
+    data_path = tmp_path / "test_profile.txt"
+    sample_profile_data.to_csv(data_path, sep='\t', index=False)
+    
+    data_c, _ = Profile(data_path).load()
+    data_arrow, _ = Profile(data_path).load(engine='pyarrow')
+    
+    pd.testing.assert_frame_equal(data_arrow, data_c, check_dtype=False)
+
+def test_profile_loading_usecols(sample_profile_data, tmp_path):
+    data_path = tmp_path / "test_profile.txt"
+    sample_profile_data.to_csv(data_path, sep='\t', index=False)
+    usecols = ['Error Standard', 'Not in this file']
+    
+    data, _ = Profile(data_path).load(usecols=usecols)
+    cached, _ = Profile(data_path).load(cache=ParsedFrameCache(tmp_path / "cache"), usecols=usecols)
+    
+    assert list(data.columns) == ['Date', 'Time', 'Error Standard', 'datetime']
+    pd.testing.assert_frame_equal(cached, data)
+
+def test_profile_iter_chunks(sample_profile_data, tmp_path):
+    data_path = tmp_path / "test_profile.txt"
+    sample_profile_data.to_csv(data_path, sep='\t', index=False)
+    
+    profile = Profile(data_path)
+    chunks = list(profile.iter_chunks(rows=4))
+    data, _ = Profile(data_path).load()
+    
+    assert [len(chunk) for chunk in chunks] == [4, 2]
+    pd.testing.assert_frame_equal(pd.concat(chunks), data)
+
+def test_profile_tail_reads_appended_lines(sample_profile_data, tmp_path):
+    data_path = tmp_path / "test_profile.txt"
+    sample_profile_data.to_csv(data_path, sep='\t', index=False)
+    text = data_path.read_bytes()
+    # Start with a partially written last line
+    data_path.write_bytes(text[:-10])
+    
+    tail = ProfileTail(data_path)
+    first = tail.read_new()
+    assert len(first) == len(sample_profile_data) - 1
+    assert len(tail.read_new()) == 0
+    
+    with open(data_path, 'ab') as f:
+        f.write(text[-10:])
+    second = tail.read_new()
+    
+    data, _ = Profile(data_path).load()
+    pd.testing.assert_frame_equal(pd.concat([first, second]), data)
+
+def test_profile_loading_cache(sample_profile_data, tmp_path):
+    data_path = tmp_path / "test_profile.txt"
+    sample_profile_data.to_csv(data_path, sep='\t', index=False)
+    cache = ParsedFrameCache(tmp_path / "cache")
+    
+    parsed, _ = Profile(data_path).load(cache=cache)
+    cached, _ = Profile(data_path).load(cache=cache)
+    
+    assert cache.get(cache.key(data_path)) is not None
+    pd.testing.assert_frame_equal(cached, parsed)
+    # Cached columns are copy-on-write: modifying them leaves the cache intact
+    cached.loc[0, 'Error Standard'] = 1.0
+    assert cache.get(cache.key(data_path))['Error Standard'].iloc[0] == 0.0120
+
+def test_cache_lru_eviction(sample_profile_data, tmp_path):
+    cache = ParsedFrameCache(tmp_path / "cache", max_bytes=1)
+    cache.put('a', sample_profile_data)
+    cache.put('b', sample_profile_data)
+    
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+def test_cache_stores_stage_frames(tmp_path):
+    # Processed frames (flags, cast labels, values masked by filtering) round-trip unchanged
+    n = 6
+    df = pd.DataFrame({
+        'Date calibrated': pd.Series(['2024/12/11', '2024/12/11', None] * 2, dtype='str'),
+        'datetime': pd.Series(pd.date_range('2024-12-11', periods=n, freq='s')).where(lambda t: t.index != 2),
+        'Depth (meter)': [0.0, 0.5, float('nan'), 1.5, 2.0, 2.5],
+        'QC_FLAGS': np.array([0, 1, 4, 0, 0, 2], dtype=np.uint64),
+        'cast': np.zeros(n, dtype=np.int64),
+        'is_downcast': [True] * 3 + [False] * 3,
+    })
+    cache = ParsedFrameCache(tmp_path / "stages")
+    cache.put('L2-key', df)
+    pd.testing.assert_frame_equal(cache.get('L2-key').copy(), df)
+    assert cache.get('L1-key') is None
+
+def test_expedition_catalog(sample_metadata_dict, sample_profile_data, tmp_path):
+    l0_dir = tmp_path / "Level0"
+    l0_dir.mkdir()
+    for name, gas, start, depth in [("a", True, "2024-12-11 10:00:00", 60.0),
+                                    ("b", True, "2024-11-27 12:58:44", 80.0),
+                                    ("c", False, "2024-12-11 12:00:00", 70.0)]:
+        data = sample_profile_data.assign(**{'Depth (meter)': [0.0] * 3 + [depth] * 3})
+        data.to_csv(l0_dir / f"{name}.txt", sep='\t', index=False)
+        with open(l0_dir / f"{name}.log", 'w') as f:
+            json.dump({**sample_metadata_dict, "Type of gas": gas, "Start time": start}, f)
+    
+    # A single bad depth sample does not count as the profile's maximum depth
+    spiked = pd.read_csv(l0_dir / "a.txt", sep='\t')
+    spiked.loc[1, 'Depth (meter)'] = 9000.0
+    spiked.to_csv(l0_dir / "a.txt", sep='\t', index=False)
+    
+    catalog = ExpeditionCatalog(tmp_path / "catalog.sqlite")
+    assert catalog.build(l0_dir) == 3
+    assert catalog.build(l0_dir) == 0
+    
+    result = catalog.query('N2O', min_depth=50,
+                           start=datetime(2024, 12, 1), end=datetime(2025, 1, 1))
+    assert list(result['data_path']) == [str(l0_dir / "a.txt")]
+    assert result['n_rows'].iloc[0] == len(sample_profile_data)
+    assert result['max_depth'].iloc[0] == 60.0
+    assert catalog.deepest() == 80.0
+    assert catalog.deepest('CH4') == 70.0
+    
+    # Removed profiles and profiles indexed under a previous location are dropped
+    (l0_dir / "b.txt").unlink()
+    catalog.build(l0_dir)
+    assert catalog.deepest() == 70.0
+    moved = shutil.copytree(l0_dir, tmp_path / "moved" / "Level0")
+    assert catalog.build(moved) == 2
+    assert list(catalog.query()['data_path']) == [str(moved / "a.txt"), str(moved / "c.txt")]
+
+def test_processing_manifest(tmp_path):
+    config = {'Depth (meter)': (-2, 11000)}
+    stages = {'L1': fingerprint('1', 'data hash', config), 'L2': fingerprint('1', 'data hash')}
+    assert fingerprint('1', 'data hash', dict(reversed(config.items()))) == stages['L1']
+    assert fingerprint('1', 'data hash', {'Depth (meter)': (0, 11000)}) != stages['L1']
+    
+    output = tmp_path / "L1A.csv"
+    output.write_text("a\n1\n")
+    manifest = ProcessingManifest(tmp_path / "manifest.json")
+    manifest.record('a.txt', stages, [output], gas_type='N2O')
+    manifest.save()
+    
+    reloaded = ProcessingManifest(tmp_path / "manifest.json")
+    assert reloaded.is_current('a.txt', stages)
+    assert reloaded.get('a.txt')['gas_type'] == 'N2O'
+    assert not reloaded.is_current('a.txt', {**stages, 'L2': fingerprint('2', 'data hash')})
+    assert not reloaded.is_current('b.txt', stages)
+    # Outputs deleted since the last run are rebuilt
+    output.unlink()
+    assert not reloaded.is_current('a.txt', stages)
+
 if __name__ == "__main__":
     # Run tests with pytest
     import pytest
@@ -0,0 +1,194 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+import tracemalloc
+
+# Add src directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(current_dir), 'src')
+sys.path.append(src_dir)
+
+from preprocessing.derived_parameters import DerivedParameters
+
+TOTAL_FLOW_TCELL = 'Total Flow (sccm) corrected Tcell'
+
+@pytest.fixture
+def sample_profile_data():
+    return pd.DataFrame({
+        '[CH4] dissolved with water vapour (ppm)': [8.5, 11.1, 8.9, 10.1, 7.9],
+        '[H2O] measured (%)': [15.3, 9.7, 16.4, 13.7, 31.1],
+        'Cellule Temperature (Degree Celsius)': [39.69, 39.69, 39.67, 39.69, 39.70],
+        'Flow Carrier Gas (sccm)': [2.0] * 5,
+        'Total Flow (sccm)': [8.62, 8.68, 8.70, 8.66, 8.61],
+    })
+
+def test_compute_runs_only_ancestors(sample_profile_data):
+    derived = DerivedParameters(sample_profile_data)
+    df = derived.compute([TOTAL_FLOW_TCELL])
+    
+    assert derived.computed == {'flows', 'h2o_tcell', 'total_flow_tcell'}
+    assert '[CH4] dissolved with water vapour (ppm) corrected Tcell' not in df.columns
+    expected = (df['Dry gas Flow [sccm]'] + df['[H2O] measured corrected Tcell']
+                + df['Flow Carrier Gas (sccm)'])
+    pd.testing.assert_series_equal(df[TOTAL_FLOW_TCELL], expected, check_names=False)
+    assert DerivedParameters.required_columns([TOTAL_FLOW_TCELL]) == [
+        'Total Flow (sccm)', 'Flow Carrier Gas (sccm)', '[H2O] measured (%)',
+        'Cellule Temperature (Degree Celsius)']
+
+def test_compute_is_memoized(sample_profile_data):
+    derived = DerivedParameters(sample_profile_data)
+    derived.compute([TOTAL_FLOW_TCELL])
+    n_logged = len(derived.calculation_log)
+    derived.compute([TOTAL_FLOW_TCELL, 'Dry gas Flow [sccm]'])
+    assert len(derived.calculation_log) == n_logged
+    
+    # Modifying an input recomputes its descendants only
+    derived.apply_moving_average('[H2O] measured (%)', window=3)
+    assert derived.computed == set()
+    derived.compute([TOTAL_FLOW_TCELL])
+    assert np.isnan(derived.df[TOTAL_FLOW_TCELL].iloc[0])
+
+def test_gas_corrections_without_flows(sample_profile_data):
+    df = DerivedParameters().calculate_gas_corrections(df=sample_profile_data.copy())
+    assert df[TOTAL_FLOW_TCELL].notna().all()
+    
+    # Missing inputs skip the step and its dependents instead of failing
+    derived = DerivedParameters(sample_profile_data.drop(columns='Total Flow (sccm)'))
+    df = derived.calculate_gas_corrections()
+    assert TOTAL_FLOW_TCELL not in df.columns
+    assert '[CH4] dissolved with water vapour (ppm) corrected Tcell' in df.columns
+
+@pytest.fixture
+def delayed_profile():
+    # Irregular sampling (1 or 2 s) over two yo-yo casts; the gas follows the
+    # pressure 17.4 s late
+    rng = np.random.default_rng(0)
+    seconds = np.cumsum(rng.choice([1.0, 2.0], size=1200, p=[0.9, 0.1]))
+    pressure = lambda t: 1 + 2 * np.sin(2 * np.pi * t / 600) ** 2 + 0.3 * np.sin(2 * np.pi * t / 97)
+    return pd.DataFrame({
+        'datetime': pd.Timestamp('2024-12-11 10:00') + pd.to_timedelta(seconds, unit='s'),
+        'Hydrostatic pressure (bar)': pressure(seconds),
+        '[CH4] dissolved with water vapour (ppm)': 5 + 3 * pressure(seconds - 17.4),
+        '[N2O] dissolved with water vapour (ppm)': 20 - pressure(seconds - 17.4),
+    })
+
+def test_estimate_time_delays(delayed_profile):
+    derived = DerivedParameters(delayed_profile)
+    gases = ['[CH4] dissolved with water vapour (ppm)', '[N2O] dissolved with water vapour (ppm)']
+    delays = derived.estimate_time_delays(gases)
+    assert delays['delay'].to_numpy() == pytest.approx([17.4, 17.4], abs=0.1)
+    assert delays.loc[gases[0], 'correlation'] > 0.9
+    assert delays.loc[gases[1], 'correlation'] < -0.9
+    
+    df = derived.apply_time_delay_correction(gases, time_delay=None)
+    expected = 5 + 3 * df['Hydrostatic pressure (bar)']
+    np.testing.assert_allclose(df[gases[0]].iloc[:-30], expected.iloc[:-30], atol=0.1)
+
+def test_all_nan_column_left_uncorrected(delayed_profile):
+    gases = ['[CH4] dissolved with water vapour (ppm)', '[N2O] dissolved with water vapour (ppm)']
+    delayed_profile[gases[1]] = np.nan
+    derived = DerivedParameters(delayed_profile)
+    delays = derived.estimate_time_delays(gases)
+    assert delays.loc[gases[0], 'delay'] == pytest.approx(17.4, abs=0.1)
+    assert delays.loc[gases[1]].isna().all()
+    
+    df = derived.apply_time_delay_correction(gases, time_delay=None)
+    assert df[gases[1]].isna().all()
+    expected = 5 + 3 * df['Hydrostatic pressure (bar)']
+    np.testing.assert_allclose(df[gases[0]].iloc[:-30], expected.iloc[:-30], atol=0.1)
+
+def test_fractional_delay_on_datetime_axis():
+    seconds = np.array([0, 1, 2, 4, 5, 6, 7], dtype=float)
+    df = pd.DataFrame({
+        'datetime': pd.Timestamp('2024-12-11') + pd.to_timedelta(seconds, unit='s'),
+        'gas': 10 * seconds,
+    })
+    result = DerivedParameters(df).apply_time_delay_correction(['gas'], time_delay=1.5)
+    # Interpolated 1.5 s later on the real time axis, last value held at the end
+    np.testing.assert_allclose(result['gas'], [15, 25, 35, 55, 65, 70, 70])
+
+def test_rolling_mean_uses_time_windows(delayed_profile):
+    gases = ['[CH4] dissolved with water vapour (ppm)', '[N2O] dissolved with water vapour (ppm)']
+    delayed_profile.loc[::13, gases[0]] = np.nan
+    expected = (delayed_profile.set_index('datetime')[gases]
+                .rolling('10s', center=True, closed='both', min_periods=1).mean())
+
+    df = DerivedParameters(delayed_profile).apply_rolling_filters(gases, window=10.0)
+    np.testing.assert_allclose(df[gases].to_numpy(), expected.to_numpy())
+    assert list(df.columns) == list(delayed_profile.columns)
+
+def test_rolling_mean_survives_huge_outlier():
+    seconds = np.arange(200.0)
+    df = pd.DataFrame({
+        'datetime': pd.Timestamp('2024-12-11') + pd.to_timedelta(seconds, unit='s'),
+        '[H2O] measured (%)': 6.06 + 0.01 * np.sin(seconds),
+    })
+    df.loc[20, '[H2O] measured (%)'] = 1.9e16
+    values = df['[H2O] measured (%)'].to_numpy()
+    expected = np.array([values[max(i - 5, 0):i + 6].mean() for i in range(len(values))])
+
+    result = DerivedParameters(df).apply_rolling_filters(['[H2O] measured (%)'], window=10.0)
+    # Windows past the outlier keep full precision
+    np.testing.assert_allclose(result['[H2O] measured (%)'].iloc[26:], expected[26:], rtol=1e-12)
+
+def test_rolling_median_and_savgol():
+    seconds = np.concatenate([np.arange(0, 60.0), np.arange(100, 160.0)])
+    df = pd.DataFrame({
+        'datetime': pd.Timestamp('2024-12-11') + pd.to_timedelta(seconds, unit='s'),
+        'spiky': np.where(seconds == 30, 100.0, 1.0),
+        'quadratic': 0.01 * seconds ** 2,
+    })
+    df.loc[10, 'quadratic'] = np.nan
+
+    median = DerivedParameters(df).apply_rolling_filters(['spiky'], window=5.0, method='median')
+    assert (median['spiky'] == 1.0).all()
+
+    derived = DerivedParameters(df)
+    smoothed = derived.apply_rolling_filters(['quadratic'], window=11.0, method='savgol', keep_original=True)
+    # A second order polynomial is kept on each side of the gap, away from the
+    # windows holding the linearly filled NaN, which stays NaN
+    far = df.index > 20
+    np.testing.assert_allclose(smoothed.loc[far, 'quadratic'], df.loc[far, 'quadratic'])
+    assert np.isnan(smoothed.loc[10, 'quadratic'])
+    pd.testing.assert_series_equal(smoothed['quadratic_unfiltered'], df['quadratic'], check_names=False)
+
+    with pytest.raises(ValueError):
+        derived.apply_rolling_filters(['quadratic'], method='gaussian')
+
+    # Rows without a timestamp must be dropped first (segment_casts)
+    df.loc[5, 'datetime'] = pd.NaT
+    with pytest.raises(ValueError):
+        DerivedParameters(df).apply_rolling_filters(['spiky'], window=5.0)
+
+def test_no_copy_mode_peak_memory():
+    n = 50_000
+    rng = np.random.default_rng(0)
+    seconds = np.arange(n, dtype=float)
+    df = pd.DataFrame({f'var {i}': rng.normal(size=n) for i in range(20)})
+    df['datetime'] = pd.Timestamp('2024-12-11') + pd.to_timedelta(seconds, unit='s')
+    df['Hydrostatic pressure (bar)'] = 1.5 * (1 - np.cos(2 * np.pi * seconds / 1200)) + rng.normal(0, 0.01, n)
+    df['[H2O] measured (%)'] = rng.normal(15, 1, n)
+    df['Total Flow (sccm)'] = 8.6
+    df['Flow Carrier Gas (sccm)'] = 2.0
+    input_size = df.memory_usage(deep=True).sum()
+    untouched = df.copy()
+
+    def peak(copy):
+        tracemalloc.start()
+        result = DerivedParameters(df, copy=copy).calculate_all()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, peak
+
+    expected, copy_peak = peak(True)
+    result, no_copy_peak = peak(False)
+    pd.testing.assert_frame_equal(result, expected)
+    pd.testing.assert_frame_equal(df, untouched)
+    # Rows dropped by the cast cleaning are the only full copy of the frame
+    assert no_copy_peak < 1.6 * input_size
+    assert no_copy_peak < copy_peak
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s'])
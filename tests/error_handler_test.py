@@ -0,0 +1,87 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(current_dir), 'src')
+sys.path.append(src_dir)
+
+from preprocessing.error_handler import ErrorHandler, P2Quantile, RollingMAD
+from preprocessing.quality_report import QualityReport, quality_table, STATISTICS
+
+@pytest.fixture
+def error_standard():
+    rng = np.random.default_rng(0)
+    values = rng.normal(0.01, 0.002, 2000)
+    values[[100, 900, 1500]] = [0.5, 0.3, -0.2]
+    return pd.DataFrame({
+        'Error Standard': values,
+        'Ringdown time (microSec)': rng.normal(13, 0.1, 2000),
+    })
+
+def test_p2_quantile_tracks_exact_quantile():
+    values = np.random.default_rng(1).lognormal(size=20000)
+    for p in [0.25, 0.5, 0.75]:
+        estimate = P2Quantile(p)
+        for chunk in np.array_split(values, 40):
+            estimate.update(chunk)
+        assert estimate.value == pytest.approx(np.quantile(values, p), rel=0.02)
+
+def test_rolling_mad_chunks_match_whole_series(error_standard):
+    values = error_standard['Error Standard'].to_numpy()
+    median, mad = RollingMAD(window=50).update(values)
+    rolling = RollingMAD(window=50)
+    chunks = [rolling.update(chunk) for chunk in np.array_split(values, 37)]
+    np.testing.assert_array_equal(np.concatenate([m for m, _ in chunks]), median)
+    np.testing.assert_array_equal(np.concatenate([d for _, d in chunks]), mad)
+    expected = pd.Series(values).rolling(50, min_periods=1).median()
+    np.testing.assert_allclose(median, expected)
+
+@pytest.mark.parametrize('method', ['zscore', 'iqr', 'mad'])
+def test_online_mode_flags_outliers(error_standard, method):
+    handler = ErrorHandler(method=method, window=100)
+    chunks = [handler.process_chunk(error_standard.iloc[start:start + 40].copy())
+              for start in range(0, len(error_standard), 40)]
+    result = pd.concat(chunks)['Error Standard']
+    assert result.loc[[100, 900, 1500]].isna().all()
+    assert result.notna().mean() > 0.95
+
+def test_batch_mode_matches_single_column(error_standard):
+    handler = ErrorHandler(method='iqr')
+    columns = list(error_standard.columns)
+    batch = handler.process_columns(error_standard, columns)
+    for column in columns:
+        single = handler.process_error_standard(error_standard, column=column)
+        pd.testing.assert_series_equal(batch[column], single[column])
+        # Same bounds as the original pandas implementation
+        q1, q3 = error_standard[column].quantile([0.25, 0.75])
+        iqr = q3 - q1
+        outside = ~error_standard[column].between(q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+        assert batch[column].isna().equals(outside)
+    # Input left untouched unless inplace
+    assert error_standard.notna().all().all()
+
+def test_quality_table_matches_describe(error_standard, tmp_path):
+    error_standard.loc[::7, 'Ringdown time (microSec)'] = np.nan
+    error_standard['is_downcast'] = True
+    
+    table = quality_table(error_standard)
+    expected = error_standard.drop(columns='is_downcast').describe().T
+    pd.testing.assert_frame_equal(table, expected[STATISTICS], check_names=False, check_dtype=False)
+    
+    metrics = ErrorHandler().get_quality_metrics(error_standard)
+    assert metrics['count'] == 2000
+    assert metrics['50%'] == pytest.approx(error_standard['Error Standard'].median())
+    
+    report = QualityReport()
+    report.add('profile_a', error_standard, gas_type='CH4')
+    report.add('profile_b', error_standard.iloc[:10], gas_type='N2O')
+    saved = QualityReport.load(report.save(tmp_path / 'qc_summary.csv'))
+    assert list(saved.columns) == ['profile', 'gas_type', 'variable'] + STATISTICS
+    assert saved.groupby('profile')['count'].max().to_dict() == {'profile_a': 2000, 'profile_b': 10}
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s'])
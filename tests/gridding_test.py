@@ -0,0 +1,147 @@
+import pytest
+import pandas as pd
+import numpy as np
+import xarray as xr
+import sys
+import os
+
+# Add src directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(current_dir), 'src')
+sys.path.append(src_dir)
+
+from preprocessing.depth_gridder import (DepthBinAccumulator, DepthGridder_xr, DepthGrid, L3BBuilder, bin_by_depth,
+                                         fill_empty_bins, stack_profiles)
+
+@pytest.fixture
+def cast_data():
+    rng = np.random.default_rng(0)
+    depth = np.linspace(0, 5, 200) + rng.normal(0, 0.01, 200)
+    return pd.DataFrame({
+        'Depth (meter)': depth,
+        '[CH4] dissolved with water vapour (ppm)': 8 + depth + rng.normal(0, 0.1, 200),
+        'Cellule Temperature (Degree Celsius)': 40 + rng.normal(0, 0.1, 200),
+    })
+
+def test_depth_bin_accumulator_chunks(cast_data):
+    whole = DepthBinAccumulator(depth_interval=0.05)
+    whole.update(cast_data)
+    
+    # Deepest samples first, so the grid has to grow in both directions
+    chunked = DepthBinAccumulator(depth_interval=0.05)
+    for start in [100, 150, 0, 50]:
+        chunked.update(cast_data.iloc[start:start + 50])
+    
+    expected = cast_data.groupby(np.round(cast_data['Depth (meter)'] / 0.05)).mean()
+    ds = chunked.to_dataset().dropna('Depth (meter)', how='all')
+    
+    xr.testing.assert_allclose(chunked.to_dataset(), whole.to_dataset())
+    np.testing.assert_allclose(ds['[CH4] dissolved with water vapour (ppm)'].values,
+                               expected['[CH4] dissolved with water vapour (ppm)'].values)
+
+def test_bin_by_depth_matches_groupby(cast_data):
+    values = cast_data.drop(columns='Depth (meter)')
+    values.iloc[::9, 0] = np.nan
+    bins = bin_by_depth(cast_data['Depth (meter)'].to_numpy(), values.to_numpy(),
+                        depth_interval=0.05, depth_min=-1.0, n_bins=141)
+    
+    grouped = values.groupby(np.floor((cast_data['Depth (meter)'] + 1.0) / 0.05 + 0.5).astype(int))
+    np.testing.assert_allclose(bins.sum[grouped.sum().index], grouped.sum())
+    np.testing.assert_array_equal(bins.count[grouped.count().index], grouped.count())
+    np.testing.assert_allclose(bins.mean[grouped.mean().index], grouped.mean())
+    assert bins.grid[20] == pytest.approx(0.0)
+    # Bins without samples and samples outside the grid
+    assert np.isnan(bins.mean[:19]).all() and bins.count[:19].sum() == 0
+    assert bins.count.sum(axis=0)[1] == len(cast_data) - (cast_data['Depth (meter)'] > 6.025).sum()
+
+def test_bin_statistics_match_groupby(cast_data):
+    values = cast_data.drop(columns='Depth (meter)')
+    values.iloc[::5, 1] = np.nan
+    bins = bin_by_depth(cast_data['Depth (meter)'].to_numpy(), values.to_numpy(),
+                        depth_interval=0.2, depth_min=0.0, n_bins=26, median=True)
+    
+    grouped = values.groupby(np.floor(cast_data['Depth (meter)'] / 0.2 + 0.5).astype(int))
+    index = grouped.count().index
+    np.testing.assert_allclose(bins.std[index], grouped.std())
+    np.testing.assert_allclose(bins.median[index], grouped.median())
+    
+    ds = DepthGridder_xr(cast_data.rename(columns={'Depth (meter)': 'Depth__meter_'})).bin_to_grid(
+        depth_interval=0.2, median=True)
+    ch4 = '[CH4] dissolved with water vapour (ppm)'
+    assert {f"{ch4}{suffix}" for suffix in ['', '_n_obs', '_std', '_median']} <= set(ds.data_vars)
+    assert int(ds[f"{ch4}_n_obs"].sum()) == len(cast_data)
+
+def test_bin_to_grid_fills_gaps(cast_data):
+    coarse = cast_data.iloc[::4].rename(columns={'Depth (meter)': 'Depth__meter_'})
+    ds = DepthGridder_xr(coarse).bin_to_grid(depth_interval=0.05)
+    # Same grid as interpolate_to_grid
+    depth = coarse['Depth__meter_']
+    np.testing.assert_allclose(ds['Depth__meter_'].values[[0, -1]], [np.floor(depth.min()), np.ceil(depth.max())])
+    ch4 = ds['[CH4] dissolved with water vapour (ppm)']
+    # Inside the sampled range every bin has a value, outside it stays empty
+    assert ch4.sel(Depth__meter_=slice(0.1, 4.9)).notnull().all()
+    assert ch4.sel(Depth__meter_=slice(depth.max() + 0.05, None)).isnull().all()
+    
+    empty = DepthGridder_xr(coarse).bin_to_grid(depth_interval=0.05, fill_empty=False)
+    assert empty['[CH4] dissolved with water vapour (ppm)'].isnull().sum() > ch4.isnull().sum()
+
+def test_fill_empty_bins_is_linear():
+    means = np.array([[1.0, np.nan], [np.nan, 5.0], [np.nan, np.nan], [4.0, 2.0], [np.nan, np.nan]])
+    counts = (~np.isnan(means)).astype(int)
+    np.testing.assert_allclose(fill_empty_bins(means, counts),
+                               [[1, np.nan], [2, 5], [3, 3.5], [4, 2], [np.nan, np.nan]])
+
+def test_shared_grid_stacks_by_index(cast_data):
+    df = cast_data.rename(columns={'Depth (meter)': 'Depth__meter_'})
+    grid = DepthGrid.from_range(-2, 10, 0.05)
+    shallow, deep = df[df['Depth__meter_'] < 2.5], df[df['Depth__meter_'] > 1.5]
+    
+    casts = {'shallow': DepthGridder_xr(shallow).bin_to_grid(grid=grid),
+             'deep': DepthGridder_xr(deep).bin_to_grid(grid=grid)}
+    # Each cast only covers its own stretch of the shared grid
+    for name, part in [('shallow', shallow), ('deep', deep)]:
+        depth = casts[name]['Depth__meter_'].values
+        assert depth[0] == pytest.approx(grid.points[grid.offset(part['Depth__meter_'].min())])
+        assert depth[-1] == pytest.approx(grid.points[grid.offset(part['Depth__meter_'].max())])
+    
+    stacked = stack_profiles(casts, grid)
+    assert dict(stacked.sizes) == {'profile': 2, 'Depth__meter_': grid.n_bins}
+    # Same values as aligning the casts on their depth coordinate
+    ch4 = '[CH4] dissolved with water vapour (ppm)'
+    aligned = [ds[ch4].reindex(Depth__meter_=grid.points, method='nearest', tolerance=1e-6).values
+               for ds in casts.values()]
+    np.testing.assert_allclose(stacked[ch4].values, aligned)
+    assert stacked[f"{ch4}_n_obs"].sum() == len(shallow) + len(deep)
+    
+    # Per-cast grids of the same interval land at their offset as well
+    own = {'shallow': DepthGridder_xr(shallow).bin_to_grid(depth_interval=0.05)}
+    np.testing.assert_allclose(stack_profiles(own, grid)[ch4].values[0], stacked[ch4].values[0])
+
+def test_l3b_builder_grows(cast_data):
+    df = cast_data.rename(columns={'Depth (meter)': 'Depth__meter_'})
+    grid = DepthGrid.from_range(-2, 10, 0.05)
+    casts = {f"c{i:02d}": DepthGridder_xr(df[df['Depth__meter_'] < 1 + i]).bin_to_grid(grid=grid)
+             for i in range(5)}
+    # A variable only gridded from the third cast on
+    for name in ['c02', 'c03', 'c04']:
+        casts[name]['extra'] = casts[name]['Cellule Temperature (Degree Celsius)']
+    
+    builder = L3BBuilder(grid, capacity=2)
+    for i, (name, ds) in enumerate(casts.items()):
+        builder.add(name, ds, cast=i)
+    ds = builder.to_dataset()
+    assert len(builder) == 5 and builder.capacity == 8
+    assert list(ds['profile'].values) == list(casts) and list(ds['cast'].values) == list(range(5))
+    xr.testing.assert_identical(ds, stack_profiles(casts, grid).assign_coords(cast=('profile', range(5))))
+    assert ds['extra'][:2].isnull().all() and ds['extra'][2:].notnull().any()
+    
+    # Rows filled by separate builders (worker processes) merge into the same dataset
+    merged = L3BBuilder(grid, capacity=1)
+    for i, (name, ds_cast) in enumerate(casts.items()):
+        part = L3BBuilder(grid)
+        part.add(name, ds_cast, cast=i)
+        merged.extend(part)
+    xr.testing.assert_identical(merged.to_dataset(), ds)
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s'])
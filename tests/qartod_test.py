@@ -0,0 +1,73 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Add src directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(current_dir), 'src')
+sys.path.append(src_dir)
+
+from preprocessing.cleaner import DataCleaner
+from preprocessing.qartod import (SensorTests, spike_test, rate_of_change_test,
+                                  flat_line_test, gradient_test)
+from preprocessing.qc_flags import QC_FLAG_COLUMN
+
+CHANNEL = 'Cavity Pressure (mbar)'
+CONFIG = {
+    CHANNEL: {'spike': 0.5, 'rate_of_change': 0.5, 'flat_line': {'count': 4, 'tolerance': 0}},
+    'Hydrostatic pressure (bar)': {'gradient': 0.2},
+}
+
+@pytest.fixture
+def sensor_data():
+    return pd.DataFrame({
+        'datetime': pd.date_range('2024-12-11 10:00:00', periods=12, freq='s'),
+        CHANNEL: [30.0, 30.1, 30.0, 32.0, 30.1, 30.0, 30.2, 30.2, 30.2, 30.2, 30.1, np.nan],
+        'Depth (meter)': np.arange(12) * 0.1,
+        'Hydrostatic pressure (bar)': 1 + np.arange(12) * 0.01,
+    })
+
+def test_individual_tests():
+    values = np.array([1.0, 1.1, 5.0, 1.2, 1.3, 1.3, 1.3, 1.3])
+    assert spike_test(values, 1.0).tolist() == [False, False, True] + [False] * 5
+    # A steady ramp is not a spike
+    assert not spike_test(np.arange(10.0), 0.5).any()
+    assert rate_of_change_test(values, np.arange(8.0), 2.0).tolist() == [False, False, True, True] + [False] * 4
+    # The same jump over 4 s is slow enough
+    assert not rate_of_change_test(values, np.arange(8.0) * 4, 2.0).any()
+    assert flat_line_test(values, count=3).tolist() == [False] * 6 + [True, True]
+    depth = np.array([0, 0.1, 0.2, 0.2, 0.3, 0.4, 0.5, 0.6])
+    assert gradient_test(values, depth, 10).tolist() == [False, False, True, False, False, False, False, False]
+
+def test_sensor_tests_share_flag_system(sensor_data):
+    tests = SensorTests(CONFIG)
+    failed = tests.evaluate(sensor_data)
+    assert failed[f"{CHANNEL} spike"].tolist() == [False] * 3 + [True] + [False] * 8
+    assert failed[f"{CHANNEL} flat_line"].tolist() == [False] * 9 + [True] + [False] * 2
+
+    packed = DataCleaner(sensor_data.copy(), packed_flags=True)
+    packed.apply_sensor_tests(tests)
+    assert f"{CHANNEL} spike" in packed.qc_flags.names
+    unpacked = DataCleaner(sensor_data.copy())
+    unpacked.apply_sensor_tests(tests)
+    assert unpacked.df[f"{CHANNEL}_FLAG"].tolist() == failed.filter(like=CHANNEL).any(axis=1).astype(int).tolist()
+
+    # The tests invalidate their channel in both layouts
+    packed.filter_flagged_row()
+    unpacked.filter_flagged_row()
+    pd.testing.assert_frame_equal(packed.df[sensor_data.columns], unpacked.df[sensor_data.columns])
+    # Rows 3-4 (spike, rate of change) and 9 (flat line), plus the missing last value
+    assert packed.df[CHANNEL].isna().sum() == 4
+
+    packed.filter_flagged_rows(columns_to_check=[CHANNEL])
+    assert packed.df['Depth (meter)'].isna().sum() == 3
+    assert packed.df[QC_FLAG_COLUMN].notna().all()
+
+def test_unknown_test_rejected():
+    with pytest.raises(ValueError):
+        SensorTests({CHANNEL: {'spikes': 1}})
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s'])